@@ -0,0 +1,127 @@
+"""Склейка одинаковых анонимных GET-запросов внутри процесса.
+
+При всплеске трафика на главную или популярный пост потоки воркера
+одновременно выполняют одни и те же запросы к БД и рендер. Middleware
+пропускает к представлению только первый запрос с данным ключом (метод,
+путь, строка запроса и заголовки из COALESCE_VARY_HEADERS), а остальные
+ждут его ответ до COALESCE_TIMEOUT секунд и получают копию.
+
+Склеиваются только запросы без cookie, кроме CSRF (она входит в ключ,
+потому что токен в форме страницы зависит от нее), а делятся только
+ответы 200 без установки cookie и не потоковые. CsrfViewMiddleware стоит
+снаружи и выставляет cookie уже после этой проверки, поэтому страница с
+токеном CSRF, отрисованная для запроса без этой cookie, не делится:
+иначе остальные получили бы токен без cookie и не смогли бы отправить
+форму. Ожидающие получают снимок ответа, сделанный до того, как внешние
+middleware начнут менять заголовки ответа ведущего запроса. Счетчики в
+metrics показывают, сколько запросов обслужено копией. Полезно лишь при
+многопоточных воркерах, например gunicorn --threads.
+"""
+import logging
+import threading
+
+from django.conf import settings
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+metrics = {"leaders": 0, "coalesced": 0, "fallbacks": 0}
+_metrics_lock = threading.Lock()
+
+
+def count(name):
+    with _metrics_lock:
+        metrics[name] += 1
+
+
+class Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.snapshot = None
+
+
+def coalesce_key(request):
+    if request.method not in ("GET", "HEAD"):
+        return None
+    csrf_cookie = settings.CSRF_COOKIE_NAME
+    if set(request.COOKIES) - {csrf_cookie}:
+        return None
+    headers = tuple(
+        request.META.get(header, "")
+        for header in settings.COALESCE_VARY_HEADERS
+    )
+    return (
+        request.method,
+        request.path,
+        request.META.get("QUERY_STRING", ""),
+        request.COOKIES.get(csrf_cookie, ""),
+        headers,
+    )
+
+
+def shareable(request, response):
+    if request.META.get("CSRF_COOKIE_USED") and (
+        settings.CSRF_COOKIE_NAME not in request.COOKIES
+    ):
+        return False
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+    )
+
+
+def snapshot(response):
+    return response.content, response.status_code, list(response.items())
+
+
+def copy_response(snapshot):
+    content, status, headers = snapshot
+    copy = HttpResponse(content, status=status)
+    for header, value in headers:
+        copy[header] = value
+    copy["X-Coalesced"] = "1"
+    return copy
+
+
+class RequestCoalescingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.lock = threading.Lock()
+        self.flights = {}
+
+    def __call__(self, request):
+        key = coalesce_key(request)
+        if key is None:
+            return self.get_response(request)
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Flight()
+        if leader:
+            return self.lead(key, flight, request)
+        return self.follow(flight, request)
+
+    def lead(self, key, flight, request):
+        count("leaders")
+        try:
+            response = self.get_response(request)
+            # снимок делается до done.set(): дальше ответ ведущего меняют
+            # внешние middleware в его потоке
+            if shareable(request, response):
+                flight.snapshot = snapshot(response)
+            return response
+        finally:
+            with self.lock:
+                del self.flights[key]
+            flight.done.set()
+
+    def follow(self, flight, request):
+        flight.done.wait(settings.COALESCE_TIMEOUT)
+        if flight.snapshot is None:
+            count("fallbacks")
+            return self.get_response(request)
+        count("coalesced")
+        logger.debug("Coalesced %s", request.get_full_path())
+        return copy_response(flight.snapshot)
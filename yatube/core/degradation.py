@@ -0,0 +1,122 @@
+"""Отдача последней удачной копии страницы, когда БД тормозит или падает.
+
+Для анонимных GET-запросов к лентам декоратор serve_stale_on_error
+хранит в кеше последнюю удачно отрисованную страницу (не чаще раза в
+DEGRADED_COPY_REFRESH секунд). Если запросы представления к БД в сумме
+превышают DEGRADED_LATENCY_BUDGET или падают с DatabaseError, вместо 500
+отдается эта копия с заголовками Warning и Age. Без копии медленное
+представление дорабатывает до конца, и превышение бюджета только
+засчитывается предохранителю.
+
+Автомат-предохранитель: после BREAKER_FAILURES сбоев за BREAKER_WINDOW
+секунд он размыкается на BREAKER_COOLDOWN секунд, и пока он разомкнут,
+страницы с копией отдаются сразу, не нагружая БД новыми запросами.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.http import HttpResponse
+
+FAILURES_KEY = "breaker:failures"
+OPEN_KEY = "breaker:open"
+
+
+class DatabaseTooSlow(DatabaseError):
+    pass
+
+
+class LatencyBudget:
+    """Обертка execute_wrapper, считающая время запросов к БД.
+
+    С enforce=False только считает, не прерывая представление.
+    """
+
+    def __init__(self, budget, enforce=True):
+        self.budget = budget
+        self.enforce = enforce
+        self.spent = 0.0
+
+    @property
+    def exceeded(self):
+        return self.spent > self.budget
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.monotonic()
+        result = execute(sql, params, many, context)
+        self.spent += time.monotonic() - started
+        if self.enforce and self.exceeded:
+            raise DatabaseTooSlow(
+                f"Запросы заняли {self.spent:.2f} с при бюджете "
+                f"{self.budget} с"
+            )
+        return result
+
+
+def breaker_open():
+    return cache.get(OPEN_KEY) is not None
+
+
+def record_failure():
+    cache.add(FAILURES_KEY, 0, settings.BREAKER_WINDOW)
+    try:
+        failures = cache.incr(FAILURES_KEY)
+    except ValueError:
+        failures = 1
+    if failures >= settings.BREAKER_FAILURES:
+        cache.set(OPEN_KEY, True, settings.BREAKER_COOLDOWN)
+        cache.delete(FAILURES_KEY)
+
+
+def copy_key(request):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f"last_good:{path}"
+
+
+def remember(request, response):
+    if response.status_code != 200 or response.streaming:
+        return
+    key = copy_key(request)
+    if cache.add(f"{key}:fresh", True, settings.DEGRADED_COPY_REFRESH):
+        copy = (time.time(), response["Content-Type"], response.content)
+        cache.set(key, copy, settings.DEGRADED_COPY_TIMEOUT)
+
+
+def stale_response(copy):
+    stored, content_type, content = copy
+    response = HttpResponse(content, content_type=content_type)
+    response["Warning"] = '110 - "Response is Stale"'
+    response["Age"] = str(max(int(time.time() - stored), 0))
+    return response
+
+
+def serve_stale_on_error(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method != "GET" or request.user.is_authenticated:
+            return view(request, *args, **kwargs)
+        copy = cache.get(copy_key(request))
+        if copy is not None and breaker_open():
+            return stale_response(copy)
+        # без копии прерывать медленное представление незачем: вместо
+        # медленного ответа получился бы 500
+        budget = LatencyBudget(
+            settings.DEGRADED_LATENCY_BUDGET, enforce=copy is not None
+        )
+        try:
+            with connection.execute_wrapper(budget):
+                response = view(request, *args, **kwargs)
+        except DatabaseError:
+            record_failure()
+            if copy is None:
+                raise
+            return stale_response(copy)
+        if budget.exceeded:
+            record_failure()
+        remember(request, response)
+        return response
+
+    return wrapper
@@ -0,0 +1,103 @@
+import multiprocessing
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from itertools import islice
+
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from core.shared_cache import SharedMemoryCache
+
+
+def set_in_child(cache, key):
+    cache.set(key, "из другого процесса")
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает SharedMemoryCache с LocMemCache и FileBasedCache: "
+        "время операций и видимость записей из другого процесса."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--ops", type=int, default=5000, help="Операций в каждом замере"
+        )
+        parser.add_argument(
+            "--value-size",
+            type=int,
+            default=2048,
+            help="Размер значения в байтах, как у фрагмента ленты",
+        )
+
+    def handle(self, *args, **options):
+        directory = tempfile.mkdtemp()
+        # все ключи замера должны помещаться в каждый кеш без вытеснения
+        params = {"OPTIONS": {"MAX_ENTRIES": options["ops"] * 2}}
+        try:
+            backends = {
+                "locmem": LocMemCache("benchmark", params),
+                "filebased": FileBasedCache(
+                    os.path.join(directory, "files"), params
+                ),
+                "shared": SharedMemoryCache(
+                    os.path.join(directory, "shared"),
+                    {
+                        "OPTIONS": {
+                            "SLOTS": options["ops"] * 2,
+                            "SLOT_SIZE": 8192,
+                        }
+                    },
+                ),
+            }
+            self.stdout.write(
+                f"{'backend':>10} {'set us':>8} {'get us':>8} "
+                f"{'get_many us':>12} {'incr us':>8} {'cross-process':>14}"
+            )
+            for name, cache in backends.items():
+                timings = self.run(cache, options)
+                visible = self.cross_process(cache)
+                self.stdout.write(
+                    f"{name:>10} {timings[0]:>8.1f} {timings[1]:>8.1f} "
+                    f"{timings[2]:>12.1f} {timings[3]:>8.1f} "
+                    f"{'yes' if visible else 'no':>14}"
+                )
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def measure(self, operation, keys):
+        samples = []
+        for key in keys:
+            start = time.perf_counter()
+            operation(key)
+            samples.append(time.perf_counter() - start)
+        return statistics.mean(samples) * 10 ** 6
+
+    def run(self, cache, options):
+        keys = [f"key:{i}" for i in range(options["ops"])]
+        value = "x" * options["value_size"]
+        iterator = iter(keys)
+        batches = list(iter(lambda: list(islice(iterator, 10)), []))
+        timings = (
+            self.measure(lambda key: cache.set(key, value), keys),
+            self.measure(cache.get, keys),
+            self.measure(cache.get_many, batches),
+        )
+        cache.set("counter", 0)
+        return timings + (
+            self.measure(lambda key: cache.incr("counter"), keys),
+        )
+
+    def cross_process(self, cache):
+        """Видит ли процесс запись, сделанную другим процессом."""
+        cache.delete("cross")
+        child = multiprocessing.get_context("fork").Process(
+            target=set_in_child, args=(cache, "cross")
+        )
+        child.start()
+        child.join()
+        return cache.get("cross") is not None
@@ -0,0 +1,44 @@
+"""Бюджет SQL-запросов на одно представление.
+
+Бюджеты задаются в settings.QUERY_BUDGETS по имени URL вида
+"posts:index". Их проверяют и тесты, и QueryBudgetMiddleware в режиме
+DEBUG, поэтому запрос на каждую строку ленты сразу становится ошибкой.
+"""
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def get_query_budget(view_name):
+    return settings.QUERY_BUDGETS.get(view_name)
+
+
+def check_query_budget(view_name, queries):
+    budget = get_query_budget(view_name)
+    if budget is None or len(queries) <= budget:
+        return
+    statements = "\n".join(query["sql"] for query in queries)
+    raise QueryBudgetExceeded(
+        f"{view_name}: {len(queries)} запросов при бюджете {budget}\n"
+        f"{statements}"
+    )
+
+
+class QueryBudgetMiddleware:
+    def __init__(self, get_response):
+        if not settings.DEBUG:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get_response(request)
+        match = request.resolver_match
+        if match is not None:
+            check_query_budget(match.view_name, queries.captured_queries)
+        return response
@@ -0,0 +1,303 @@
+"""Кеш, общий для всех процессов одной машины, в отображенном в память файле.
+
+LocMemCache у каждого воркера свой, поэтому попадания делятся на число
+воркеров, а сброс фрагмента в одном воркере не виден остальным. Этот
+бэкенд держит данные в файле LOCATION фиксированного размера, который все
+процессы отображают в память через mmap, и не требует внешних служб.
+
+Файл устроен как множественно-ассоциативная таблица: ключ по хешу попадает
+в корзину из WAYS слотов размером SLOT_SIZE байт, а при заполненной
+корзине вытесняется слот по алгоритму CLOCK: бит обращения ставится при
+чтении, и прочитанные с прошлого обхода записи получают второй шанс.
+Значение, не помещающееся в слот, не кешируется. Все операции, включая
+incr, get_many и set_many, выполняются под блокировкой экземпляра и flock
+на файле, поэтому атомарны и между потоками, и между процессами. Слот,
+который не удалось распаковать (например, процесс убит посреди записи),
+считается промахом и освобождается.
+
+Пример настройки:
+
+    CACHES = {
+        "default": {
+            "BACKEND": "core.shared_cache.SharedMemoryCache",
+            "LOCATION": "/dev/shm/yatube-cache",
+            "OPTIONS": {"SLOTS": 2048, "SLOT_SIZE": 65536, "WAYS": 8},
+        }
+    }
+"""
+import fcntl
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+MAGIC = b"YTSC"
+VERSION = 1
+# magic, версия, число слотов, размер слота, слотов в корзине
+HEADER = struct.Struct("<4sIIII")
+# хеш ключа, срок годности (0 — бессрочно), состояние, бит обращения,
+# длина ключа, длина значения
+SLOT = struct.Struct("<QdBBHI")
+EMPTY = 0
+USED = 1
+STATE_OFFSET = 16
+REF_OFFSET = 17
+MISSING = object()
+
+
+def key_hash(key):
+    digest = hashlib.blake2b(key, digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+class SharedMemoryCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self._path = location
+        self._ways = int(options.get("WAYS", 8))
+        self._buckets = max(int(options.get("SLOTS", 1024)) // self._ways, 1)
+        self._slot_size = int(options.get("SLOT_SIZE", 64 * 1024))
+        self._hands = HEADER.size
+        self._data = HEADER.size + self._buckets
+        self._size = self._data + (
+            self._buckets * self._ways * self._slot_size
+        )
+        self._header = HEADER.pack(
+            MAGIC,
+            VERSION,
+            self._buckets * self._ways,
+            self._slot_size,
+            self._ways,
+        )
+        self._pid = None
+        self._fd = None
+        self._map = None
+        # flock не разделяет потоки с общим дескриптором, поэтому потоки
+        # одного процесса сначала берут эту блокировку
+        self._lock = threading.Lock()
+        instance = weakref.ref(self)
+        os.register_at_fork(
+            after_in_child=lambda: instance() and instance()._after_fork()
+        )
+
+    def _after_fork(self):
+        # блокировку мог держать поток родителя, которого в потомке нет
+        self._lock = threading.Lock()
+
+    def _open(self):
+        # вызывается под self._lock; после fork дескриптор и блокировка
+        # общие с родителем, поэтому каждый процесс открывает файл заново
+        if self._pid == os.getpid():
+            return
+        fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(fd).st_size != self._size or (
+                os.pread(fd, HEADER.size, 0) != self._header
+            ):
+                # чужая или устаревшая разметка: файл создается заново
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, self._size)
+                os.pwrite(fd, self._header, 0)
+            self._map = mmap.mmap(fd, self._size)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        self._fd = fd
+        self._pid = os.getpid()
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            self._open()
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield self._map
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _slot_offset(self, bucket, way):
+        return self._data + (bucket * self._ways + way) * self._slot_size
+
+    def _find(self, mm, key, hashed, now):
+        """Смещение живого слота с ключом или None."""
+        bucket = hashed % self._buckets
+        for way in range(self._ways):
+            offset = self._slot_offset(bucket, way)
+            slot_hash, expires, state, _, key_len, _ = SLOT.unpack_from(
+                mm, offset
+            )
+            if state != USED or slot_hash != hashed:
+                continue
+            start = offset + SLOT.size
+            end = start + key_len
+            if mm[start:end] != key:
+                continue
+            if expires and expires <= now:
+                mm[offset + STATE_OFFSET] = EMPTY
+                return None
+            return offset
+        return None
+
+    def _victim(self, mm, bucket, now):
+        """Свободный или просроченный слот корзины, иначе жертва CLOCK."""
+        for way in range(self._ways):
+            offset = self._slot_offset(bucket, way)
+            _, expires, state, _, _, _ = SLOT.unpack_from(mm, offset)
+            if state != USED or (expires and expires <= now):
+                return offset
+        hand = mm[self._hands + bucket]
+        while True:
+            offset = self._slot_offset(bucket, hand)
+            hand = (hand + 1) % self._ways
+            if mm[offset + REF_OFFSET]:
+                mm[offset + REF_OFFSET] = 0
+                continue
+            mm[self._hands + bucket] = hand
+            return offset
+
+    def _load(self, mm, offset):
+        """Значение слота или MISSING, если слот поврежден."""
+        _, _, _, _, key_len, value_len = SLOT.unpack_from(mm, offset)
+        start = offset + SLOT.size + key_len
+        end = start + value_len
+        try:
+            if end > offset + self._slot_size:
+                raise ValueError("Длина значения больше слота")
+            value = pickle.loads(mm[start:end])
+        except Exception:
+            mm[offset + STATE_OFFSET] = EMPTY
+            return MISSING
+        mm[offset + REF_OFFSET] = 1
+        return value
+
+    def _expires(self, mm, offset):
+        return SLOT.unpack_from(mm, offset)[1]
+
+    def _store(self, mm, key, hashed, value, expires, now):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        offset = self._find(mm, key, hashed, now)
+        if SLOT.size + len(key) + len(data) > self._slot_size:
+            # значение не помещается в слот; старое не должно остаться
+            if offset is not None:
+                mm[offset + STATE_OFFSET] = EMPTY
+            return False
+        if offset is None:
+            offset = self._victim(mm, hashed % self._buckets, now)
+        start = offset + SLOT.size
+        middle = start + len(key)
+        end = middle + len(data)
+        mm[start:middle] = key
+        mm[middle:end] = data
+        SLOT.pack_into(
+            mm, offset, hashed, expires or 0.0, USED, 0, len(key), len(data)
+        )
+        return True
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key.encode()
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._locked() as mm:
+            hashed = key_hash(key)
+            if self._find(mm, key, hashed, now) is not None:
+                return False
+            expires = self.get_backend_timeout(timeout)
+            return self._store(mm, key, hashed, value, expires, now)
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        with self._locked() as mm:
+            offset = self._find(mm, key, key_hash(key), time.time())
+            value = MISSING if offset is None else self._load(mm, offset)
+            return default if value is MISSING else value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        expires = self.get_backend_timeout(timeout)
+        with self._locked() as mm:
+            self._store(mm, key, key_hash(key), value, expires, time.time())
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._locked() as mm:
+            offset = self._find(mm, key, key_hash(key), time.time())
+            if offset is None:
+                return False
+            expires = self.get_backend_timeout(timeout) or 0.0
+            struct.pack_into("<d", mm, offset + 8, expires)
+            return True
+
+    def incr(self, key, delta=1, version=None):
+        """Атомарно между потоками и процессами, в отличие от BaseCache."""
+        raw_key = self._key(key, version)
+        now = time.time()
+        with self._locked() as mm:
+            hashed = key_hash(raw_key)
+            offset = self._find(mm, raw_key, hashed, now)
+            value = MISSING if offset is None else self._load(mm, offset)
+            if value is MISSING:
+                raise ValueError("Key '%s' not found" % key)
+            value += delta
+            expires = self._expires(mm, offset)
+            self._store(mm, raw_key, hashed, value, expires, now)
+            return value
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        with self._locked() as mm:
+            offset = self._find(mm, key, key_hash(key), time.time())
+            if offset is not None:
+                mm[offset + STATE_OFFSET] = EMPTY
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        with self._locked() as mm:
+            return self._find(mm, key, key_hash(key), time.time()) is not None
+
+    def get_many(self, keys, version=None):
+        found = {}
+        now = time.time()
+        with self._locked() as mm:
+            for key in keys:
+                raw_key = self._key(key, version)
+                offset = self._find(mm, raw_key, key_hash(raw_key), now)
+                if offset is None:
+                    continue
+                value = self._load(mm, offset)
+                if value is not MISSING:
+                    found[key] = value
+        return found
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        now = time.time()
+        failed = []
+        with self._locked() as mm:
+            for key, value in data.items():
+                raw_key = self._key(key, version)
+                if not self._store(
+                    mm, raw_key, key_hash(raw_key), value, expires, now
+                ):
+                    failed.append(key)
+        return failed
+
+    def clear(self):
+        with self._locked() as mm:
+            hands, data = self._hands, self._data
+            mm[hands:data] = bytes(self._buckets)
+            for bucket in range(self._buckets):
+                for way in range(self._ways):
+                    offset = self._slot_offset(bucket, way)
+                    mm[offset + STATE_OFFSET] = EMPTY
@@ -0,0 +1,104 @@
+"""Кеширование дорогих значений без «давки» при их устаревании.
+
+Когда фрагмент ленты устаревает под нагрузкой, обычный get/set заставляет
+все одновременные запросы заново выполнить запросы к БД и рендер. Здесь
+значение хранится вместе со временем своего вычисления и логическим сроком
+годности, а в кеше живет дольше этого срока на STAMPEDE_STALE_SECONDS:
+
+* пересчитывает значение только тот, кто взял короткую блокировку
+  cache.add, остальные в это время получают устаревшую копию;
+* пересчет начинается заранее с вероятностью, растущей к концу срока и
+  со временем вычисления (XFetch, Vattani и др., 2015), поэтому у
+  популярных ключей копия обычно обновляется до истечения срока;
+* при полном промахе остальные запросы недолго ждут результат того, кто
+  пересчитывает, а не идут в БД все сразу;
+* если ключ содержит версию данных (фрагменты лент), новая версия дает
+  промах без устаревшей копии. Для этого вызывающий передает stale_key —
+  ключ без версии, под которым лежит последнее вычисленное значение, и
+  пока один запрос пересчитывает, остальные получают его.
+"""
+import math
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def lock_key(key):
+    return f"stampede_lock:{key}"
+
+
+def should_refresh(computed_in, expires, now, beta=None):
+    """XFetch: пора ли пересчитать еще не истекшее значение."""
+    if expires is None:
+        return False
+    beta = settings.STAMPEDE_BETA if beta is None else beta
+    # 1 - random() лежит в (0, 1], поэтому логарифм определен
+    gap = -computed_in * beta * math.log(1 - random.random())
+    return now + gap >= expires
+
+
+def store(key, value, computed_in, timeout, stale_key=None):
+    expires = None if timeout is None else time.time() + timeout
+    physical = None
+    if timeout is not None:
+        physical = timeout + settings.STAMPEDE_STALE_SECONDS
+    entry = (value, computed_in, expires)
+    entries = {key: entry}
+    if stale_key is not None:
+        entries[stale_key] = entry
+    cache.set_many(entries, physical)
+
+
+def recompute(key, compute, timeout, stale_key=None):
+    started = time.monotonic()
+    try:
+        value = compute()
+        store(key, value, time.monotonic() - started, timeout, stale_key)
+    finally:
+        cache.delete(lock_key(key))
+    return value
+
+
+def wait_for(key):
+    """Ждет, пока значение положит тот, кто держит блокировку."""
+    deadline = time.monotonic() + settings.STAMPEDE_WAIT_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(settings.STAMPEDE_POLL_SECONDS)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def get_or_compute(key, compute, timeout, stale_key=None):
+    """Значение из кеша или compute(), вызванный одним запросом за раз.
+
+    timeout — логический срок годности в секундах (None — бессрочно),
+    stale_key — ключ последнего значения без учета версии в key.
+    """
+    entry = cache.get(key)
+    if entry is not None:
+        value, computed_in, expires = entry
+        if not should_refresh(computed_in, expires, time.time()):
+            return value
+        if not cache.add(lock_key(key), True, settings.STAMPEDE_LOCK_TIMEOUT):
+            return value
+        return recompute(key, compute, timeout, stale_key)
+
+    if cache.add(lock_key(key), True, settings.STAMPEDE_LOCK_TIMEOUT):
+        return recompute(key, compute, timeout, stale_key)
+    if stale_key is not None:
+        entry = cache.get(stale_key)
+        if entry is not None:
+            return entry[0]
+    entry = wait_for(key)
+    if entry is not None:
+        return entry[0]
+    # тот, кто пересчитывал, не успел; считаем сами, но без записи в
+    # кеш не остаемся
+    started = time.monotonic()
+    value = compute()
+    store(key, value, time.monotonic() - started, timeout, stale_key)
+    return value
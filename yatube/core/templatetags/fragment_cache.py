@@ -0,0 +1,64 @@
+from core.stampede import get_or_compute
+from django import template
+from django.core.cache.utils import make_template_fragment_key
+
+register = template.Library()
+
+VERSION_PREFIX = "version="
+
+
+class FragmentCacheNode(template.Node):
+    def __init__(self, nodelist, timeout, fragment_name, vary_on, version):
+        self.nodelist = nodelist
+        self.timeout = timeout
+        self.fragment_name = fragment_name
+        self.vary_on = vary_on
+        self.version = version
+
+    def render(self, context):
+        timeout = self.timeout.resolve(context)
+        if timeout is not None:
+            timeout = int(timeout)
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        stale_key = None
+        if self.version is None:
+            key = make_template_fragment_key(self.fragment_name, vary_on)
+        else:
+            version = self.version.resolve(context)
+            key = make_template_fragment_key(
+                self.fragment_name, vary_on + [version]
+            )
+            stale_key = make_template_fragment_key(
+                f"{self.fragment_name}:last", vary_on
+            )
+        return get_or_compute(
+            key, lambda: self.nodelist.render(context), timeout, stale_key
+        )
+
+
+@register.tag
+def fragment_cache(parser, token):
+    """Как {% cache %}, но устаревший фрагмент пересчитывает один запрос.
+
+    {% fragment_cache timeout name var1 var2 version=feed_version %}
+    ...{% endfragment_cache %}
+    Остальные запросы тем временем получают прежнюю копию, в том числе
+    копию прежней версии, если задан version, см. core.stampede.
+    """
+    nodelist = parser.parse(("endfragment_cache",))
+    parser.delete_first_token()
+    tokens = token.split_contents()
+    if len(tokens) < 3:
+        raise template.TemplateSyntaxError(
+            f"'{tokens[0]}' tag requires at least 2 arguments."
+        )
+    version = None
+    if len(tokens) > 3 and tokens[-1].startswith(VERSION_PREFIX):
+        version = parser.compile_filter(tokens.pop().split("=", 1)[1])
+    return FragmentCacheNode(
+        nodelist,
+        parser.compile_filter(tokens[1]),
+        tokens[2],
+        [parser.compile_filter(token) for token in tokens[3:]],
+        version,
+    )
@@ -1,6 +1,41 @@
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
 from http import HTTPStatus
+from unittest import mock
 
-from django.test import TestCase
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.db import OperationalError
+from django.http import HttpResponse
+from django.middleware.csrf import CsrfViewMiddleware
+from django.template import Context, Template, engines
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+)
+
+from . import coalescing
+from .coalescing import RequestCoalescingMiddleware
+from .degradation import breaker_open, serve_stale_on_error
+from .shared_cache import SLOT, SharedMemoryCache, key_hash
+from .stampede import get_or_compute, lock_key, should_refresh, store
+
+User = get_user_model()
+
+
+def increment(cache, times):
+    for _ in range(times):
+        cache.incr("counter")
 
 
 class ViewTestClass(TestCase):
@@ -10,3 +45,334 @@ class ViewTestClass(TestCase):
         response = self.client.get("/nonexist-page/")
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, "core/404.html")
+
+
+class SharedMemoryCacheTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.location = os.path.join(directory, "cache")
+        self.cache = self.make_cache()
+
+    def make_cache(self, **options):
+        options = {"SLOTS": 64, "SLOT_SIZE": 512, **options}
+        return SharedMemoryCache(self.location, {"OPTIONS": options})
+
+    def test_basic_operations(self):
+        self.cache.set("key", {"value": 1})
+        self.assertEqual(self.cache.get("key"), {"value": 1})
+        self.assertFalse(self.cache.add("key", "other"))
+        self.assertTrue(self.cache.add("new", "value"))
+        self.cache.delete("key")
+        self.assertIsNone(self.cache.get("key"))
+        self.cache.set("short", 1, timeout=-1)
+        self.assertIsNone(self.cache.get("short"))
+
+    def test_many_and_clear(self):
+        self.assertEqual(self.cache.set_many({"a": 1, "b": "x" * 1000}), ["b"])
+        self.assertEqual(self.cache.get_many(["a", "b", "c"]), {"a": 1})
+        self.cache.clear()
+        self.assertEqual(self.cache.get_many(["a"]), {})
+
+    def test_shared_between_processes(self):
+        """Запись и incr в одном процессе видны в другом."""
+        self.cache.set("counter", 0)
+        context = multiprocessing.get_context("fork")
+        workers = [
+            context.Process(target=increment, args=(self.cache, 50))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(self.make_cache().get("counter"), 200)
+
+    def test_incr_atomic_between_threads(self):
+        """Потоки одного процесса не теряют инкременты."""
+        self.cache.set("counter", 0)
+        self.addCleanup(sys.setswitchinterval, sys.getswitchinterval())
+        sys.setswitchinterval(1e-6)
+        threads = [
+            threading.Thread(target=increment, args=(self.cache, 2000))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.cache.get("counter"), 16000)
+
+    def test_damaged_slot_is_miss(self):
+        """Недописанное значение считается промахом, а слот освобождается."""
+        self.cache.set("key", "value")
+        self.cache.set("counter", 1)
+        with self.cache._locked() as mm:
+            for key in ("key", "counter"):
+                raw_key = self.cache._key(key, None)
+                offset = self.cache._find(mm, raw_key, key_hash(raw_key), 0)
+                start = offset + SLOT.size + len(raw_key)
+                end = offset + self.cache._slot_size
+                mm[start:end] = bytes(end - start)
+        self.assertIsNone(self.cache.get("key"))
+        self.assertFalse(self.cache.has_key("key"))
+        with self.assertRaises(ValueError):
+            self.cache.incr("counter")
+
+    def test_clock_keeps_recently_read(self):
+        cache = self.make_cache(SLOTS=2, WAYS=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual(cache.get_many(["a", "b", "c"]), {"a": 1, "c": 3})
+
+
+class StampedeTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return f"значение {self.calls}"
+
+    def test_fresh_value_not_recomputed(self):
+        self.assertEqual(get_or_compute("key", self.compute, 60), "значение 1")
+        self.assertEqual(get_or_compute("key", self.compute, 60), "значение 1")
+        self.assertEqual(self.calls, 1)
+
+    def test_stale_value_served_while_locked(self):
+        """Пока другой запрос пересчитывает, отдается прежняя копия."""
+        get_or_compute("key", self.compute, 60)
+        cache.add(lock_key("key"), True)
+        with mock.patch("core.stampede.should_refresh", return_value=True):
+            self.assertEqual(
+                get_or_compute("key", self.compute, 60), "значение 1"
+            )
+        self.assertEqual(self.calls, 1)
+
+    def test_expired_value_recomputed_once(self):
+        get_or_compute("key", self.compute, 60)
+        with mock.patch("core.stampede.should_refresh", return_value=True):
+            self.assertEqual(
+                get_or_compute("key", self.compute, 60), "значение 2"
+            )
+        self.assertIsNone(cache.get(lock_key("key")))
+
+    def test_xfetch_refreshes_early(self):
+        """Чем дольше вычисление, тем раньше срока начинается пересчет."""
+        now = time.time()
+        with mock.patch("core.stampede.random.random", return_value=0.99):
+            self.assertTrue(should_refresh(1.0, now + 2, now))
+            self.assertFalse(should_refresh(0.001, now + 2, now))
+        self.assertFalse(should_refresh(1.0, None, now))
+
+    @override_settings(STAMPEDE_WAIT_SECONDS=0.2)
+    def test_miss_waits_for_recompute(self):
+        cache.add(lock_key("key"), True)
+
+        def fill():
+            time.sleep(0.05)
+            store("key", "готово", 0.1, 60)
+
+        thread = threading.Thread(target=fill)
+        thread.start()
+        self.assertEqual(get_or_compute("key", self.compute, 60), "готово")
+        thread.join()
+        self.assertEqual(self.calls, 0)
+
+    def test_fragment_cache_tag(self):
+        source = (
+            "{% load fragment_cache %}"
+            "{% fragment_cache 60 block name %}{{ value }}"
+            "{% endfragment_cache %}"
+        )
+        first = Template(source).render(Context({"name": 1, "value": "a"}))
+        second = Template(source).render(Context({"name": 1, "value": "b"}))
+        other = Template(source).render(Context({"name": 2, "value": "c"}))
+        self.assertEqual((first, second, other), ("a", "a", "c"))
+
+    def test_new_version_served_previous_copy(self):
+        """Пока новую версию пересчитывает другой запрос, отдается прежняя."""
+        get_or_compute("key:1", self.compute, 60, stale_key="key")
+        cache.add(lock_key("key:2"), True)
+        with mock.patch("core.stampede.wait_for") as wait_for:
+            self.assertEqual(
+                get_or_compute("key:2", self.compute, 60, stale_key="key"),
+                "значение 1",
+            )
+        wait_for.assert_not_called()
+        self.assertEqual(self.calls, 1)
+
+    def test_fragment_cache_tag_version(self):
+        source = (
+            "{% load fragment_cache %}"
+            "{% fragment_cache 60 block name version=v %}{{ value }}"
+            "{% endfragment_cache %}"
+        )
+        context = {"name": 1, "value": "a", "v": 1}
+        Template(source).render(Context(context))
+        context.update(value="b", v=2)
+        self.assertEqual(Template(source).render(Context(context)), "b")
+        context.update(value="c", v=3)
+        key = make_template_fragment_key("block", [1, 3])
+        cache.add(lock_key(key), True)
+        self.assertEqual(Template(source).render(Context(context)), "b")
+
+
+class ServeStaleOnErrorTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.calls = 0
+        self.failing = False
+
+    @property
+    def view(self):
+        @serve_stale_on_error
+        def view(request):
+            self.calls += 1
+            if self.failing:
+                raise OperationalError("БД недоступна")
+            User.objects.exists()
+            return HttpResponse(f"страница {self.calls}")
+
+        return view
+
+    def get(self, user=None):
+        request = self.factory.get("/feed/?page=2")
+        request.user = user or AnonymousUser()
+        return self.view(request)
+
+    def test_stale_copy_served_on_error(self):
+        self.get()
+        self.failing = True
+        response = self.get()
+        self.assertEqual(response.content.decode(), "страница 1")
+        self.assertIn("110", response["Warning"])
+        self.assertIn("Age", response)
+
+    def test_error_without_copy_raises(self):
+        self.failing = True
+        with self.assertRaises(OperationalError):
+            self.get()
+
+    def test_authenticated_not_degraded(self):
+        self.get()
+        self.failing = True
+        with self.assertRaises(OperationalError):
+            self.get(user=User(username="reader"))
+
+    @override_settings(DEGRADED_LATENCY_BUDGET=-1)
+    def test_latency_budget(self):
+        with override_settings(DEGRADED_LATENCY_BUDGET=10):
+            self.get()
+        response = self.get()
+        self.assertEqual(response.content.decode(), "страница 1")
+
+    @override_settings(DEGRADED_LATENCY_BUDGET=-1, BREAKER_FAILURES=1)
+    def test_slow_view_without_copy_finishes(self):
+        """Без копии медленная страница отдается, а сбой засчитывается."""
+        response = self.get()
+        self.assertEqual(response.content.decode(), "страница 1")
+        self.assertTrue(breaker_open())
+
+    @override_settings(BREAKER_FAILURES=2)
+    def test_breaker_stops_calling_view(self):
+        """Разомкнутый предохранитель отдает копию, не трогая БД."""
+        self.get()
+        self.failing = True
+        self.get()
+        self.get()
+        self.assertTrue(breaker_open())
+        calls = self.calls
+        self.assertIn("Warning", self.get())
+        self.assertEqual(self.calls, calls)
+
+
+class RequestCoalescingTest(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.calls = 0
+        self.release = threading.Event()
+
+    def view(self, request):
+        self.calls += 1
+        self.release.wait(1)
+        return HttpResponse(f"ответ {self.calls}")
+
+    def csrf_view(self, request):
+        self.calls += 1
+        self.release.wait(1)
+        return HttpResponse(
+            engines["django"]
+            .from_string("{% csrf_token %}")
+            .render(request=request)
+        )
+
+    def run_concurrently(self, requests, handler=None):
+        middleware = handler or RequestCoalescingMiddleware(self.view)
+        responses = [None] * len(requests)
+
+        def call(index):
+            responses[index] = middleware(requests[index])
+
+        threads = [
+            threading.Thread(target=call, args=(index,))
+            for index in range(len(requests))
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        return responses
+
+    def test_identical_requests_share_response(self):
+        before = dict(coalescing.metrics)
+        responses = self.run_concurrently(
+            [self.factory.get("/?page=2") for _ in range(4)]
+        )
+        self.assertEqual(self.calls, 1)
+        self.assertEqual({r.content for r in responses}, {"ответ 1".encode()})
+        self.assertEqual(
+            coalescing.metrics["coalesced"] - before["coalesced"], 3
+        )
+
+    def test_different_requests_not_coalesced(self):
+        """Запросы с другим путем, заголовком или сессией идут отдельно."""
+        requests = [
+            self.factory.get("/"),
+            self.factory.get("/?page=2"),
+            self.factory.get("/", HTTP_ACCEPT_LANGUAGE="en"),
+            self.factory.post("/"),
+        ]
+        with_session = self.factory.get("/")
+        with_session.COOKIES["sessionid"] = "abc"
+        self.run_concurrently(requests + [with_session])
+        self.assertEqual(self.calls, 5)
+
+    def test_copy_unaffected_by_later_leader_changes(self):
+        """Внешние middleware меняют ответ ведущего уже после снимка."""
+        response = HttpResponse("ответ", content_type="text/plain")
+        snapshot = coalescing.snapshot(response)
+        response["X-Frame-Options"] = "DENY"
+        copy = coalescing.copy_response(snapshot)
+        self.assertEqual(copy.content, "ответ".encode())
+        self.assertEqual(copy["Content-Type"], "text/plain")
+        self.assertNotIn("X-Frame-Options", copy)
+
+    def test_page_with_new_csrf_token_not_shared(self):
+        """Каждый, кто получил токен CSRF в форме, получает и cookie."""
+        handler = CsrfViewMiddleware(
+            RequestCoalescingMiddleware(self.csrf_view)
+        )
+        responses = self.run_concurrently(
+            [self.factory.get("/auth/signup/") for _ in range(3)], handler
+        )
+        self.assertEqual(self.calls, 3)
+        for response in responses:
+            self.assertIn(b"csrfmiddlewaretoken", response.content)
+            self.assertIn(settings.CSRF_COOKIE_NAME, response.cookies)
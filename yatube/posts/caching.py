@@ -0,0 +1,89 @@
+"""Ключи кеша лент и карточек постов.
+
+Каждая лента (главная, группа, профиль) имеет счетчик версии в кеше.
+Сигналы Post увеличивают его при сохранении и удалении поста, поэтому
+закешированные фрагменты со старой версией просто перестают читаться и
+их время жизни можно делать большим. Карточки постов кешируются по id,
+дате изменения поста и отпечатку выводимых полей автора и группы. Их
+правка не меняет дату поста, поэтому сигналы User и Group увеличивают
+общую версию карточек, которая входит в версию каждой ленты.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def version_key(*parts):
+    return ":".join(["feed", "version", *map(str, parts)])
+
+
+def initial_version():
+    # После вытеснения ключа счетчик не должен вернуться к значению,
+    # под которым еще лежат старые фрагменты.
+    return int(time.time() * 1000)
+
+
+def get_feed_versions(feeds):
+    keys = [version_key(*parts) for parts in feeds]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, initial_version(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def get_feed_version(*parts):
+    return get_feed_versions([parts])[0]
+
+
+def bump_feed_version(*parts):
+    key = version_key(*parts)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, initial_version(), None)
+
+
+def follow_feed_version(author_ids):
+    """Версия ленты подписок — отпечаток версий профилей ее авторов."""
+    author_ids = sorted(author_ids)
+    versions = get_feed_versions([("profile", pk) for pk in author_ids])
+    fingerprint = ",".join(
+        f"{pk}:{version}" for pk, version in zip(author_ids, versions)
+    )
+    return hashlib.md5(fingerprint.encode()).hexdigest()
+
+
+CARD_TEMPLATE = "includes/post_list.html"
+CARD_TEMPLATES = (CARD_TEMPLATE, "includes/profile_post.html")
+
+
+def card_key(post, template_name=CARD_TEMPLATE):
+    stamp = post.updated.timestamp()
+    author = post.author
+    related = "|".join(
+        [
+            author.username,
+            author.get_full_name(),
+            post.group.slug if post.group_id else "",
+        ]
+    )
+    digest = hashlib.md5(related.encode()).hexdigest()[:12]
+    return f"post_card:{template_name}:{post.pk}:{stamp}:{digest}"
+
+
+def invalidate_post_cards(post):
+    cache.delete_many([card_key(post, name) for name in CARD_TEMPLATES])
+
+
+TAG_CLOUD_KEY = "tag_cloud"
+
+
+def feed_cache_context(version):
+    return {
+        "feed_version": f"{version}.{get_feed_version('cards')}",
+        "feed_cache_timeout": settings.FEED_CACHE_TIMEOUT,
+    }
@@ -0,0 +1,106 @@
+"""Денормализованные счетчики постов, комментариев, подписок и тегов.
+
+Счетчики меняются атомарно через F() из сигналов создания и удаления,
+в том числе при каскадном удалении. Команда rebuild_counters
+пересчитывает их целиком пачками.
+"""
+from django.db.models import Count, F
+
+from .models import AuthorStats, Comment, Follow, Post, Tag, TagPost
+
+
+def adjust_author_stats(user_id, **deltas):
+    changes = {field: F(field) + delta for field, delta in deltas.items()}
+    stats = AuthorStats.objects.filter(user_id=user_id)
+    if stats.update(**changes) or min(deltas.values()) < 0:
+        return
+    # Строки счетчиков создаются лениво; при уменьшении ее не создаем,
+    # чтобы не ссылаться на удаляемого в каскаде пользователя.
+    AuthorStats.objects.get_or_create(user_id=user_id)
+    stats.update(**changes)
+
+
+def adjust_comments_count(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=F("comments_count") + delta
+    )
+
+
+def adjust_tag_count(tag_id, delta):
+    Tag.objects.filter(pk=tag_id).update(posts_count=F("posts_count") + delta)
+
+
+def get_author_stats(user):
+    return AuthorStats.objects.filter(user=user).first() or AuthorStats(
+        user=user
+    )
+
+
+def count_by(queryset, field, ids):
+    return dict(
+        queryset.filter(**{f"{field}__in": ids})
+        .values_list(field)
+        .annotate(total=Count("pk"))
+        .order_by()
+    )
+
+
+def rebuild_author_stats(user_ids):
+    posts = count_by(Post.objects, "author_id", user_ids)
+    followers = count_by(Follow.objects, "author_id", user_ids)
+    following = count_by(Follow.objects, "user_id", user_ids)
+    stats = [
+        AuthorStats(
+            user_id=user_id,
+            posts_count=posts.get(user_id, 0),
+            followers_count=followers.get(user_id, 0),
+            following_count=following.get(user_id, 0),
+        )
+        for user_id in user_ids
+    ]
+    existing = set(
+        AuthorStats.objects.filter(user_id__in=user_ids).values_list(
+            "user_id", flat=True
+        )
+    )
+    AuthorStats.objects.bulk_update(
+        [item for item in stats if item.user_id in existing],
+        ["posts_count", "followers_count", "following_count"],
+    )
+    AuthorStats.objects.bulk_create(
+        [item for item in stats if item.user_id not in existing],
+        ignore_conflicts=True,
+    )
+
+
+def rebuild_comment_counts(post_ids):
+    comments = count_by(Comment.objects, "post_id", post_ids)
+    Post.objects.bulk_update(
+        [
+            Post(pk=post_id, comments_count=comments.get(post_id, 0))
+            for post_id in post_ids
+        ],
+        ["comments_count"],
+    )
+
+
+def rebuild_tag_counts(tag_ids):
+    posts = count_by(TagPost.objects, "tag_id", tag_ids)
+    Tag.objects.bulk_update(
+        [
+            Tag(pk=tag_id, posts_count=posts.get(tag_id, 0))
+            for tag_id in tag_ids
+        ],
+        ["posts_count"],
+    )
+
+
+def id_batches(queryset, batch_size):
+    ids = queryset.order_by("pk").values_list("pk", flat=True)
+    last = 0
+    while True:
+        batch = list(ids.filter(pk__gt=last)[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last = batch[-1]
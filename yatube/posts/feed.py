@@ -0,0 +1,284 @@
+"""Материализованная лента подписок (fan-out on write).
+
+Новый пост раскладывается по таблице FeedEntry всех подписчиков автора,
+поэтому follow_index читает ленту читателя одним проходом по индексу
+(user, -pub_date) вместо соединения Follow и Post.
+
+В гибридном режиме посты авторов, у которых подписчиков больше
+FEED_FANOUT_FOLLOWER_LIMIT, не раскладываются, а подмешиваются в ленту при
+чтении k-way слиянием по pub_date. Когда после отписки подписчиков
+становится не больше порога, последние посты автора раскладываются по
+лентам оставшихся подписчиков (catch_up).
+"""
+import heapq
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from . import utils
+from .caching import bump_feed_version
+from .models import AuthorStats, FeedEntry, Follow, Post
+
+PULL = "pull"
+PUSH = "push"
+HYBRID = "hybrid"
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.FEED_FANOUT_WORKERS,
+            thread_name_prefix="feed-fanout",
+        )
+    return _executor
+
+
+def follower_counts(author_ids):
+    """Число подписчиков авторов по денормализованным счетчикам."""
+    counts = dict.fromkeys(author_ids, 0)
+    counts.update(
+        AuthorStats.objects.filter(user_id__in=author_ids).values_list(
+            "user_id", "followers_count"
+        )
+    )
+    return counts
+
+
+def is_pushed(author_id, mode=None):
+    """Раскладываются ли посты автора по лентам подписчиков."""
+    mode = mode or settings.FOLLOW_FEED_MODE
+    if mode == PULL:
+        return False
+    if mode == PUSH:
+        return True
+    count = follower_counts([author_id])[author_id]
+    return count <= settings.FEED_FANOUT_FOLLOWER_LIMIT
+
+
+def followed_authors(user):
+    return list(
+        Follow.objects.filter(user=user).values_list("author_id", flat=True)
+    )
+
+
+def pulled_authors(user, mode=None):
+    """Авторы, чьи посты подмешиваются в ленту читателя при чтении."""
+    mode = mode or settings.FOLLOW_FEED_MODE
+    if mode != HYBRID:
+        return []
+    author_ids = followed_authors(user)
+    counts = follower_counts(author_ids)
+    return [
+        author_id
+        for author_id in author_ids
+        if counts[author_id] > settings.FEED_FANOUT_FOLLOWER_LIMIT
+    ]
+
+
+class MergedFeed:
+    """Ленивое k-way слияние лент, упорядоченных по (-pub_date, -pk).
+
+    Поддерживает count() и срезы, поэтому подходит для Paginator, а также
+    seek() для курсорной пагинации.
+    """
+
+    def __init__(self, *sources):
+        self.sources = sources
+
+    def count(self):
+        return sum(source.count() for source in self.sources)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return self[key:key + 1][0]
+        rows = self.merge(source[:key.stop] for source in self.sources)
+        return list(islice(rows, key.start, key.stop))
+
+    def seek(self, cursor, limit):
+        rows = list(
+            self.merge(
+                utils.seek(source, cursor, limit) for source in self.sources
+            )
+        )
+        if cursor is not None and cursor.direction == utils.NEWER:
+            return rows[-limit:]
+        return rows[:limit]
+
+    @staticmethod
+    def merge(rows):
+        return heapq.merge(
+            *rows, key=lambda post: (post.pub_date, post.pk), reverse=True
+        )
+
+
+def deliver(post, user_ids):
+    FeedEntry.objects.bulk_create(
+        [
+            FeedEntry(
+                user_id=user_id,
+                post_id=post.pk,
+                author_id=post.author_id,
+                pub_date=post.pub_date,
+            )
+            for user_id in user_ids
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def follower_batch(author_id, after=0):
+    followers = Follow.objects.filter(
+        author_id=author_id, user_id__gt=after
+    ).order_by("user_id")
+    return list(
+        followers.values_list("user_id", flat=True)[
+            : settings.FEED_FANOUT_BATCH_SIZE
+        ]
+    )
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора.
+
+    Первая пачка пишется в текущей транзакции, так что небольшая аудитория
+    видит пост сразу. Остальные пачки после коммита уходят в фоновый пул.
+    """
+    if not is_pushed(post.author_id):
+        return
+    user_ids = follower_batch(post.author_id)
+    deliver(post, user_ids)
+    if len(user_ids) == settings.FEED_FANOUT_BATCH_SIZE:
+        transaction.on_commit(
+            lambda: get_executor().submit(
+                fan_out_rest, post.pk, user_ids[-1]
+            )
+        )
+
+
+def deliver_all(post, after=0):
+    while True:
+        user_ids = follower_batch(post.author_id, after)
+        if not user_ids:
+            return
+        deliver(post, user_ids)
+        after = user_ids[-1]
+
+
+def fan_out_rest(post_id, after):
+    try:
+        post = Post.objects.filter(pk=post_id).first()
+        if post is not None:
+            deliver_all(post, after)
+            # ленты подписок, отрисованные до доставки, не должны остаться
+            # в кеше без поста
+            bump_feed_version("profile", post.author_id)
+    except Exception:
+        logger.exception("Fan-out of post %s failed", post_id)
+    finally:
+        connection.close()
+
+
+def recent_posts(author_id):
+    posts = Post.objects.filter(author_id=author_id).order_by("-pub_date")
+    return list(
+        posts.values_list("pk", "pub_date")[: settings.FEED_BACKFILL_LIMIT]
+    )
+
+
+def fill_inbox(user_id, author_id, posts):
+    FeedEntry.objects.bulk_create(
+        [
+            FeedEntry(
+                user_id=user_id,
+                post_id=post_id,
+                author_id=author_id,
+                pub_date=pub_date,
+            )
+            for post_id, pub_date in posts
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту читателя последние посты нового автора."""
+    if not is_pushed(author_id):
+        return
+    fill_inbox(user_id, author_id, recent_posts(author_id))
+
+
+def catch_up(author_id):
+    """Раскладывает посты автора, опустившегося до порога гибридного режима.
+
+    Пока подписчиков было больше FEED_FANOUT_FOLLOWER_LIMIT, его посты не
+    раскладывались, а подмешивались при чтении. Теперь автор читается
+    только из лент, поэтому оставшиеся подписчики получают его последние
+    посты, как при новой подписке. Это до FEED_FANOUT_FOLLOWER_LIMIT лент
+    по FEED_BACKFILL_LIMIT постов, поэтому работа уходит в фоновый пул
+    после коммита.
+    """
+    if settings.FOLLOW_FEED_MODE != HYBRID:
+        return
+    count = follower_counts([author_id])[author_id]
+    if count != settings.FEED_FANOUT_FOLLOWER_LIMIT:
+        return
+    transaction.on_commit(
+        lambda: get_executor().submit(catch_up_rest, author_id)
+    )
+
+
+def catch_up_rest(author_id):
+    try:
+        posts = recent_posts(author_id)
+        after = 0
+        while True:
+            user_ids = follower_batch(author_id, after)
+            if not user_ids:
+                break
+            for user_id in user_ids:
+                fill_inbox(user_id, author_id, posts)
+            after = user_ids[-1]
+        # страницы ленты, отрисованные до раскладки, могли остаться без
+        # этих постов
+        bump_feed_version("profile", author_id)
+    except Exception:
+        logger.exception("Catch-up of author %s failed", author_id)
+    finally:
+        connection.close()
+
+
+def prune(user_id, author_id):
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def get_follow_feed(user, mode=None):
+    mode = mode or settings.FOLLOW_FEED_MODE
+    if mode == PULL:
+        return utils.with_feed_related(
+            Post.objects.filter(author__following__user=user)
+        )
+
+    inbox = utils.with_feed_related(
+        Post.objects.filter(feed_entries__user=user)
+    ).order_by("-feed_entries__pub_date", "-feed_entries__post__id")
+    pulled = pulled_authors(user, mode)
+    if not pulled:
+        return inbox
+    return MergedFeed(
+        inbox.exclude(author_id__in=pulled),
+        *(
+            utils.with_feed_related(Post.objects.filter(author_id=author_id))
+            for author_id in pulled
+        ),
+    )
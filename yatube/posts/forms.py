@@ -1,5 +1,7 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
+from . import images, ingest
 from .models import Comment, Post
 
 
@@ -9,6 +11,17 @@ class PostForm(forms.ModelForm):
         fields = ["text", "group", "image"]
         labels = {"text": "Текст поста", "group": "Группа"}
 
+    def clean_image(self):
+        image = self.cleaned_data["image"]
+        if isinstance(image, UploadedFile):
+            return ingest.ingest(image)
+        return image
+
+    def save(self, commit=True):
+        if "image" in self.changed_data:
+            images.set_metadata(self.instance, self.cleaned_data["image"])
+        return super().save(commit)
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,176 @@
+"""Уменьшенные копии картинок постов для /media/thumb/<ширина>/<путь>.
+
+Копия создается при первом запросе (или заранее пулом из posts.thumbnails)
+и хранится в дисковом кеше MEDIA_ROOT/IMAGE_CACHE_DIR, разложенном по
+подкаталогам ab/cd/ по sha1 ключа. Ключ зависит от пути, размеров кадра,
+формата и качества, поэтому он же служит ETag, а ответ можно кешировать
+навсегда: после смены POST_IMAGE_RATIO или IMAGE_QUALITY копии получают
+новые ключи, а прежние удаляет команда maintain_media.
+
+Сведения о самой картинке (размеры, объем, формат, sha256 и размытая
+заглушка) снимаются один раз при загрузке, см. describe.
+"""
+import base64
+import hashlib
+import io
+import os
+import posixpath
+import tempfile
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from PIL import Image, ImageFilter, ImageOps, features
+
+JPEG = "jpeg"
+WEBP = "webp"
+CONTENT_TYPES = {JPEG: "image/jpeg", WEBP: "image/webp"}
+SOURCE_PREFIX = "posts/"
+PLACEHOLDER_WIDTH = 16
+METADATA_FIELDS = {
+    "image_width": None,
+    "image_height": None,
+    "image_size": None,
+    "image_format": "",
+    "image_hash": "",
+    "image_placeholder": "",
+}
+
+
+class ImageNotFound(Exception):
+    pass
+
+
+def available_formats():
+    return [JPEG, WEBP] if features.check("webp") else [JPEG]
+
+
+def negotiate_format(accept):
+    """WebP, если клиент его принимает и Pillow умеет его писать."""
+    if "image/webp" in (accept or "") and WEBP in available_formats():
+        return WEBP
+    return JPEG
+
+
+def clean_source(path):
+    """Нормализованный путь картинки поста или ImageNotFound."""
+    path = posixpath.normpath(path)
+    if not path.startswith(SOURCE_PREFIX) or ".." in path.split("/"):
+        raise ImageNotFound(path)
+    return path
+
+
+def cache_key(path, width, fmt):
+    width, height = target_size(width)
+    raw = f"{path}|{width}x{height}|{fmt}|{settings.IMAGE_QUALITY}"
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def cache_path(key, fmt):
+    return os.path.join(
+        settings.MEDIA_ROOT,
+        settings.IMAGE_CACHE_DIR,
+        key[:2],
+        key[2:4],
+        f"{key}.{fmt}",
+    )
+
+
+def target_size(width):
+    ratio_width, ratio_height = settings.POST_IMAGE_RATIO
+    return width, round(width * ratio_height / ratio_width)
+
+
+def resize(source, width, fmt, destination):
+    with default_storage.open(source, "rb") as file:
+        image = Image.open(file)
+        image = ImageOps.fit(
+            image.convert("RGBA"), target_size(width), Image.LANCZOS
+        )
+    if fmt == JPEG:
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.split()[-1])
+        image = background
+    directory = os.path.dirname(destination)
+    os.makedirs(directory, exist_ok=True)
+    # пишем во временный файл рядом и переименовываем, чтобы параллельный
+    # запрос не прочитал недописанную картинку
+    handle, temporary = tempfile.mkstemp(dir=directory)
+    try:
+        with os.fdopen(handle, "wb") as file:
+            image.save(file, fmt, quality=settings.IMAGE_QUALITY)
+        os.replace(temporary, destination)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def get_thumbnail(path, width, fmt):
+    """Путь к файлу копии в дисковом кеше; при промахе она создается."""
+    if width not in settings.POST_IMAGE_WIDTHS:
+        raise ImageNotFound(path)
+    path = clean_source(path)
+    destination = cache_path(cache_key(path, width, fmt), fmt)
+    if not os.path.exists(destination):
+        try:
+            resize(path, width, fmt, destination)
+        except (OSError, ValueError) as error:
+            raise ImageNotFound(path) from error
+    return destination
+
+
+def placeholder(image):
+    """Крошечная размытая копия в пропорциях карточки как data: URI."""
+    image = ImageOps.fit(
+        image.convert("RGB"), target_size(PLACEHOLDER_WIDTH), Image.BILINEAR
+    )
+    buffer = io.BytesIO()
+    image.filter(ImageFilter.GaussianBlur(1)).save(buffer, "PNG")
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return f"data:image/png;base64,{encoded}"
+
+
+def describe(file):
+    """Метаданные загружаемой картинки для полей image_* поста.
+
+    Файл читается по частям для sha256, а для заглушки большие JPEG
+    декодируются в уменьшенном виде (draft), так что целиком в памяти
+    картинка не распаковывается.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    file.seek(0)
+    for chunk in file.chunks():
+        digest.update(chunk)
+        size += len(chunk)
+    file.seek(0)
+    image = Image.open(file)
+    width, height = image.size
+    fmt = image.format.lower()
+    image.draft("RGB", target_size(PLACEHOLDER_WIDTH * 4))
+    metadata = {
+        "image_width": width,
+        "image_height": height,
+        "image_size": size,
+        "image_format": fmt,
+        "image_hash": digest.hexdigest(),
+        "image_placeholder": placeholder(image),
+    }
+    file.seek(0)
+    return metadata
+
+
+def set_metadata(post, file):
+    """Заполняет поля image_* поста по новой картинке или очищает их."""
+    metadata = describe(file) if file else METADATA_FIELDS
+    for field, value in metadata.items():
+        setattr(post, field, value)
+
+
+def drop_thumbnails(path):
+    """Удаляет из дискового кеша все копии картинки."""
+    for width in settings.POST_IMAGE_WIDTHS:
+        for fmt in (JPEG, WEBP):
+            try:
+                os.remove(cache_path(cache_key(path, width, fmt), fmt))
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,89 @@
+"""Прием загруженных картинок постов с ограниченным расходом памяти.
+
+Django пишет загрузки крупнее FILE_UPLOAD_MAX_MEMORY_SIZE во временный
+файл частями, а здесь картинка проверяется только по заголовку: Image.open
+читает формат и размеры, не распаковывая пиксели. Файлы, превышающие
+лимиты объема или числа пикселей (в том числе «бомбы» распаковки),
+отклоняются до декодирования, а оригиналы крупнее POST_IMAGE_MAX_SIDE
+уменьшаются до сохранения в хранилище.
+"""
+import os
+import warnings
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from PIL import Image
+
+ALLOWED_FORMATS = {"JPEG", "PNG", "GIF", "WEBP"}
+LOSSY_FORMATS = {"JPEG", "WEBP"}
+
+
+def open_header(file):
+    """Открывает картинку, прочитав только заголовок."""
+    file.seek(0)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", Image.DecompressionBombWarning)
+        try:
+            return Image.open(file)
+        except (
+            Image.DecompressionBombWarning,
+            Image.DecompressionBombError,
+        ) as error:
+            raise ValidationError(
+                "Слишком большое изображение.", code="too_many_pixels"
+            ) from error
+        except OSError as error:
+            raise ValidationError(
+                "Файл не является изображением.", code="invalid_image"
+            ) from error
+
+
+def inspect(file):
+    """Проверяет объем, формат и число пикселей до декодирования."""
+    if file.size > settings.POST_IMAGE_MAX_BYTES:
+        raise ValidationError(
+            "Файл больше %(limit)s МБ.",
+            code="too_large",
+            params={"limit": settings.POST_IMAGE_MAX_BYTES // 2 ** 20},
+        )
+    image = open_header(file)
+    if image.format not in ALLOWED_FORMATS:
+        raise ValidationError(
+            "Формат %(format)s не поддерживается.",
+            code="invalid_format",
+            params={"format": image.format},
+        )
+    width, height = image.size
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            "Слишком большое изображение.", code="too_many_pixels"
+        )
+    return image
+
+
+def downscale(file, image):
+    """Уменьшает оригинал до POST_IMAGE_MAX_SIDE по большей стороне.
+
+    thumbnail пользуется draft, поэтому JPEG декодируется сразу в
+    уменьшенном масштабе. Результат пишется во временный файл.
+    """
+    limit = settings.POST_IMAGE_MAX_SIDE
+    if max(image.size) <= limit:
+        file.seek(0)
+        return file
+    fmt = image.format
+    image.thumbnail((limit, limit), Image.LANCZOS)
+    result = TemporaryUploadedFile(file.name, file.content_type, 0, None)
+    options = {}
+    if fmt in LOSSY_FORMATS:
+        options["quality"] = settings.IMAGE_QUALITY
+    image.save(result, fmt, **options)
+    result.flush()
+    result.size = os.path.getsize(result.temporary_file_path())
+    result.seek(0)
+    return result
+
+
+def ingest(file):
+    return downscale(file, inspect(file))
@@ -0,0 +1,157 @@
+"""Обслуживание файлов картинок: копии в дисковом кеше и сироты.
+
+Команда maintain_media читает имена картинок из БД пачками, раздает их
+пулу процессов для проверки копий (недостающие и старше оригинала
+создаются заново) и затем сверяет с БД содержимое MEDIA_ROOT/posts и
+дискового кеша копий: файлы, на которые не ссылается ни один пост, и
+копии с ключами, которые больше не получаются из текущих настроек,
+удаляются. Проход по копиям можно продолжить с места остановки по
+файлу состояния.
+"""
+import json
+import logging
+import os
+import re
+import time
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+
+from . import images
+from .media import get_storage, is_tracked, remove_unreferenced
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+CACHE_FILE_RE = re.compile(r"^[0-9a-f]{40}\.\w+$")
+
+
+def image_names(chunk_size, after=""):
+    """Имена картинок постов по алфавиту, без повторов."""
+    return (
+        Post.objects.exclude(image="")
+        .filter(image__gt=after)
+        .order_by("image")
+        .values_list("image", flat=True)
+        .distinct()
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def expected_keys(names):
+    return {
+        images.cache_key(name, width, fmt)
+        for name in names
+        for width in settings.POST_IMAGE_WIDTHS
+        for fmt in (images.JPEG, images.WEBP)
+    }
+
+
+def is_fresh(path, source_time):
+    try:
+        return os.path.getmtime(path) >= source_time
+    except OSError:
+        return False
+
+
+def refresh_thumbnails(names, dry_run=False):
+    """Создает недостающие и устаревшие копии картинок.
+
+    Выполняется в рабочем процессе; возвращает число проверенных
+    картинок и число копий, которые нужно было создать.
+    """
+    storage = get_storage()
+    stale = 0
+    for name in names:
+        try:
+            source_time = os.path.getmtime(storage.path(name))
+        except (OSError, SuspiciousFileOperation):
+            continue
+        for width in settings.POST_IMAGE_WIDTHS:
+            for fmt in images.available_formats():
+                key = images.cache_key(name, width, fmt)
+                destination = images.cache_path(key, fmt)
+                if is_fresh(destination, source_time):
+                    continue
+                stale += 1
+                if dry_run:
+                    continue
+                try:
+                    images.resize(name, width, fmt, destination)
+                except (OSError, ValueError):
+                    logger.exception("Thumbnail for %s failed", name)
+    return len(names), stale
+
+
+def walk_files(root):
+    """Пути файлов внутри root относительно него, через "/"."""
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            yield os.path.relpath(path, root).replace(os.sep, "/")
+
+
+def find_orphans(referenced, grace):
+    """Файлы в каталоге картинок постов, на которые нет ссылок."""
+    storage = get_storage()
+    root = storage.path(images.SOURCE_PREFIX)
+    threshold = time.time() - grace
+    for relative in walk_files(root):
+        name = images.SOURCE_PREFIX + relative
+        if name in referenced or not is_tracked(name):
+            continue
+        if os.path.getmtime(storage.path(name)) <= threshold:
+            yield name
+
+
+def remove_orphan(name, grace):
+    """Удаляет сироту, если на него все еще нет ссылок."""
+    return remove_unreferenced(name, time.time() - grace)
+
+
+def find_stale_cache(keys):
+    """Файлы дискового кеша, ключи которых не ожидаются для картинок."""
+    root = os.path.join(settings.MEDIA_ROOT, settings.IMAGE_CACHE_DIR)
+    for relative in walk_files(root):
+        filename = relative.rsplit("/", 1)[-1]
+        # временные файлы resize и посторонние файлы не трогаем
+        if not CACHE_FILE_RE.match(filename):
+            continue
+        if filename.split(".", 1)[0] not in keys:
+            yield os.path.join(root, relative)
+
+
+class Progress:
+    """Файл состояния прохода по копиям для продолжения с места остановки.
+
+    Пачки завершаются в пуле не по порядку, поэтому сохраняется последнее
+    имя из непрерывного начала завершенных пачек.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.finished = {}
+        self.next_index = 0
+
+    def load(self):
+        try:
+            with open(self.path) as file:
+                return json.load(file)["after"]
+        except (OSError, ValueError, KeyError):
+            return ""
+
+    def done(self, index, last_name):
+        self.finished[index] = last_name
+        after = None
+        while self.next_index in self.finished:
+            after = self.finished.pop(self.next_index)
+            self.next_index += 1
+        if after is not None:
+            with open(self.path, "w") as file:
+                json.dump({"after": after}, file)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,35 @@
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.tags import sync_tags
+
+
+class Command(BaseCommand):
+    help = "Заполняет теги существующих постов по хештегам в тексте."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Сколько постов обрабатывать за один проход",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        posts = (
+            Post.objects.order_by("pk")
+            .only("pk", "text", "pub_date")
+            .iterator(chunk_size=batch_size)
+        )
+        done = 0
+        while True:
+            batch = list(islice(posts, batch_size))
+            if not batch:
+                break
+            sync_tags(batch)
+            done += len(batch)
+            self.stdout.write(f"Постов обработано: {done}")
+        self.stdout.write(self.style.SUCCESS("Теги заполнены"))
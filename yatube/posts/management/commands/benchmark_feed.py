@@ -0,0 +1,128 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.test import override_settings
+
+from posts import feed
+from posts.counters import rebuild_author_stats
+from posts.models import FeedEntry, Follow, Post, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает ленты подписок pull, push и hybrid на синтетических "
+        "данных. Все созданные записи откатываются."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--followers",
+            type=int,
+            nargs="+",
+            default=[10000, 100000],
+            help="Число подписчиков популярного автора",
+        )
+        parser.add_argument(
+            "--authors",
+            type=int,
+            default=50,
+            help="Число обычных авторов в подписках читателя",
+        )
+        parser.add_argument(
+            "--posts", type=int, default=20, help="Постов у каждого автора"
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=5, help="Повторов каждого замера"
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'followers':>10} {'mode':>7} {'fan-out ms':>11} "
+            f"{'page 1 ms':>10} {'page 5 ms':>10}"
+        )
+        for followers in options["followers"]:
+            with transaction.atomic():
+                rows = self.run(followers, options)
+                transaction.set_rollback(True)
+            for mode, fan_out_ms, first_ms, deep_ms in rows:
+                self.stdout.write(
+                    f"{followers:>10} {mode:>7} {fan_out_ms:>11.1f} "
+                    f"{first_ms:>10.2f} {deep_ms:>10.2f}"
+                )
+
+    def run(self, followers, options):
+        (reader,) = self.create_users("bench-reader", 1)
+        (celebrity,) = self.create_users("bench-celebrity", 1)
+        authors = self.create_users("bench-author", options["authors"])
+        audience = self.create_users("bench-follower", followers - 1)
+        follows = [Follow(user=reader, author=celebrity)]
+        follows += [Follow(user=user, author=celebrity) for user in audience]
+        follows += [Follow(user=reader, author=author) for author in authors]
+        Follow.objects.bulk_create(follows)
+
+        Post.objects.bulk_create(
+            [
+                Post(author=author, text=f"Пост {i}")
+                for author in (celebrity, *authors)
+                for i in range(options["posts"])
+            ]
+        )
+        rebuild_author_stats([user.pk for user in (celebrity, *authors)])
+        posts = Post.objects.filter(author__in=(celebrity, *authors))
+        FeedEntry.objects.bulk_create(
+            [
+                FeedEntry(
+                    user=reader,
+                    post=post,
+                    author_id=post.author_id,
+                    pub_date=post.pub_date,
+                )
+                for post in posts
+            ]
+        )
+
+        post = Post.objects.filter(author=celebrity).first()
+        started = time.perf_counter()
+        feed.deliver_all(post)
+        push_fan_out_ms = (time.perf_counter() - started) * 1000
+
+        fan_out_ms = {
+            feed.PULL: 0.0,
+            feed.PUSH: push_fan_out_ms,
+            feed.HYBRID: 0.0,
+        }
+        limit = min(followers - 1, len(authors) + 1)
+        with override_settings(FEED_FANOUT_FOLLOWER_LIMIT=limit):
+            return [
+                (
+                    mode,
+                    fan_out_ms[mode],
+                    self.time_page(reader, mode, 1, options["repeat"]),
+                    self.time_page(reader, mode, 5, options["repeat"]),
+                )
+                for mode in (feed.PULL, feed.PUSH, feed.HYBRID)
+            ]
+
+    def create_users(self, prefix, count):
+        User.objects.bulk_create(
+            [
+                User(username=f"{prefix}:{i}", password="!")
+                for i in range(count)
+            ]
+        )
+        users = User.objects.filter(username__startswith=f"{prefix}:")
+        return list(users.order_by("pk"))
+
+    def time_page(self, reader, mode, number, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            posts = feed.get_follow_feed(reader, mode)
+            page = Paginator(posts, settings.POST_ON_PAGE).get_page(number)
+            list(page)
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
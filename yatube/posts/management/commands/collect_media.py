@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.media import collect_orphans
+
+
+class Command(BaseCommand):
+    help = "Удаляет файлы картинок, на которые не ссылается ни один пост."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace",
+            type=int,
+            default=settings.MEDIA_GC_GRACE_SECONDS,
+            help="Не трогать файлы, измененные за это число секунд",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только показать файлы, которые были бы удалены",
+        )
+
+    def handle(self, *args, **options):
+        removed = collect_orphans(options["grace"], options["dry_run"])
+        for name in removed:
+            self.stdout.write(name)
+        verb = "К удалению" if options["dry_run"] else "Удалено"
+        self.stdout.write(self.style.SUCCESS(f"{verb} файлов: {len(removed)}"))
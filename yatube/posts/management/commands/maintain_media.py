@@ -0,0 +1,159 @@
+import multiprocessing
+import os
+from concurrent.futures import (
+    ALL_COMPLETED,
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    wait,
+)
+from itertools import islice
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.maintenance import (
+    Progress,
+    expected_keys,
+    find_orphans,
+    find_stale_cache,
+    image_names,
+    refresh_thumbnails,
+    remove_orphan,
+)
+from posts.models import Post
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def drain(pending, return_when):
+    done, _ = wait(pending, return_when=return_when)
+    for future in done:
+        index, names = pending.pop(future)
+        yield index, names, future.result()
+
+
+class Command(BaseCommand):
+    help = (
+        "Досоздает недостающие и устаревшие копии картинок и удаляет "
+        "файлы, на которые не ссылается ни один пост."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.POST_THUMBNAIL_WORKERS,
+            help="Число рабочих процессов; 0 — в текущем процессе",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=200,
+            help="Сколько картинок отдавать процессу за раз",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только посчитать, ничего не создавая и не удаляя",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Продолжить проход по копиям с места остановки",
+        )
+        parser.add_argument(
+            "--state",
+            default=os.path.join(settings.MEDIA_ROOT, ".maintain_media.json"),
+            help="Файл состояния для --resume",
+        )
+        parser.add_argument(
+            "--grace",
+            type=int,
+            default=settings.MEDIA_GC_GRACE_SECONDS,
+            help="Не удалять файлы без ссылок моложе этого числа секунд",
+        )
+
+    def handle(self, *args, **options):
+        self.refresh(options)
+        self.collect(options)
+
+    def run_chunks(self, chunks, workers, dry_run):
+        """Результаты пачек по мере готовности: (номер, пачка, итог)."""
+        if workers < 1:
+            for index, names in enumerate(chunks):
+                yield index, names, refresh_thumbnails(names, dry_run)
+            return
+        # spawn, как и в posts.thumbnails: процессы не наследуют
+        # соединения родителя с БД
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=django.setup,
+        ) as pool:
+            pending = {}
+            for index, names in enumerate(chunks):
+                future = pool.submit(refresh_thumbnails, names, dry_run)
+                pending[future] = (index, names)
+                if len(pending) >= workers * 2:
+                    yield from drain(pending, FIRST_COMPLETED)
+            yield from drain(pending, ALL_COMPLETED)
+
+    def refresh(self, options):
+        dry_run = options["dry_run"]
+        progress = Progress(options["state"])
+        after = progress.load() if options["resume"] else ""
+        total = (
+            Post.objects.exclude(image="")
+            .filter(image__gt=after)
+            .values("image")
+            .distinct()
+            .count()
+        )
+        chunk_size = options["chunk_size"]
+        chunks = chunked(image_names(chunk_size, after), chunk_size)
+        checked = stale = 0
+        for index, names, result in self.run_chunks(
+            chunks, options["workers"], dry_run
+        ):
+            checked += result[0]
+            stale += result[1]
+            if not dry_run:
+                progress.done(index, names[-1])
+            self.stdout.write(
+                f"Картинок проверено: {checked}/{total}, "
+                f"копий к созданию: {stale}"
+            )
+        if not dry_run:
+            progress.clear()
+
+    def collect(self, options):
+        dry_run = options["dry_run"]
+        referenced = set(image_names(options["chunk_size"]))
+        orphans = list(find_orphans(referenced, options["grace"]))
+        stale = list(find_stale_cache(expected_keys(referenced)))
+        if not dry_run:
+            orphans = [
+                name
+                for name in orphans
+                if remove_orphan(name, options["grace"])
+            ]
+        for name in orphans:
+            self.stdout.write(f"Без ссылок: {name}")
+        if not dry_run:
+            for path in stale:
+                os.remove(path)
+        verb = "К удалению" if dry_run else "Удалено"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{verb} файлов без ссылок: {len(orphans)}, "
+                f"устаревших копий: {len(stale)}"
+            )
+        )
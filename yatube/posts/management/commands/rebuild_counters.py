@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import (
+    id_batches,
+    rebuild_author_stats,
+    rebuild_comment_counts,
+    rebuild_tag_counts,
+)
+from posts.models import Post, Tag, User
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает счетчики постов, комментариев, подписок и тегов "
+        "пачками."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Сколько строк обрабатывать за один запрос",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        users = 0
+        for user_ids in id_batches(User.objects, batch_size):
+            rebuild_author_stats(user_ids)
+            users += len(user_ids)
+            self.stdout.write(f"Пользователей пересчитано: {users}")
+
+        posts = 0
+        for post_ids in id_batches(Post.objects, batch_size):
+            rebuild_comment_counts(post_ids)
+            posts += len(post_ids)
+            self.stdout.write(f"Постов пересчитано: {posts}")
+
+        tags = 0
+        for tag_ids in id_batches(Tag.objects, batch_size):
+            rebuild_tag_counts(tag_ids)
+            tags += len(tag_ids)
+            self.stdout.write(f"Тегов пересчитано: {tags}")
+        self.stdout.write(self.style.SUCCESS("Счетчики пересчитаны"))
@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.warmup import warm
+
+
+class Command(BaseCommand):
+    help = (
+        "Заполняет кеш страницами главной, активных групп и популярных "
+        "профилей и копиями картинок с них."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--pages",
+            type=int,
+            default=settings.CACHE_WARM_PAGES,
+            help="Сколько первых страниц главной отрисовать",
+        )
+        parser.add_argument(
+            "--groups",
+            type=int,
+            default=settings.CACHE_WARM_GROUPS,
+            help="Сколько самых активных групп отрисовать",
+        )
+        parser.add_argument(
+            "--profiles",
+            type=int,
+            default=settings.CACHE_WARM_PROFILES,
+            help="Сколько профилей с наибольшим числом подписчиков",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=settings.CACHE_WARM_CONCURRENCY,
+            help="Число потоков; 0 — в текущем потоке",
+        )
+        parser.add_argument(
+            "--budget",
+            type=float,
+            default=settings.CACHE_WARM_BUDGET,
+            help="Не начинать новых задач после этого числа секунд",
+        )
+
+    def handle(self, *args, **options):
+        log = self.stdout.write
+        if options["verbosity"] < 2:
+            log = lambda message: None  # noqa: E731
+        done, failed, skipped = warm(
+            options["pages"],
+            options["groups"],
+            options["profiles"],
+            options["concurrency"],
+            options["budget"],
+            log=log,
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Прогрето: {done}, ошибок: {failed}, пропущено: {skipped}"
+            )
+        )
@@ -0,0 +1,89 @@
+"""Учет ссылок на файлы картинок и сборка осиротевших файлов.
+
+Одинаковые загрузки делят один файл (posts.storage), поэтому удалить
+картинку вместе с постом нельзя. StoredImage.refs меняется атомарно через
+F() из сигналов поста, а файлы с нулем ссылок после правки или удаления
+постов удаляет команда collect_media, выждав MEDIA_GC_GRACE_SECONDS.
+"""
+import time
+
+from django.conf import settings
+from django.db.models import F
+
+from . import images
+from .models import Post, StoredImage
+
+
+def get_storage():
+    return Post._meta.get_field("image").storage
+
+
+def is_tracked(name):
+    """Учитываются только файлы из каталога картинок постов."""
+    try:
+        return bool(name) and images.clean_source(name) == name
+    except images.ImageNotFound:
+        return False
+
+
+def adjust_refs(name, delta):
+    if not is_tracked(name):
+        return
+    refs = StoredImage.objects.filter(name=name)
+    if refs.update(refs=F("refs") + delta) or delta < 0:
+        return
+    StoredImage.objects.get_or_create(name=name)
+    refs.update(refs=F("refs") + delta)
+
+
+def modified_at(storage, name):
+    try:
+        return storage.get_modified_time(name).timestamp()
+    except OSError:
+        return 0
+
+
+def remove_unreferenced(name, threshold):
+    """Удаляет файл без ссылок, не измененный после threshold.
+
+    Условия проверяются заново прямо перед удалением: между поиском сирот
+    и удалением те же байты могли загрузить снова. Учтенный файл
+    удаляется, только если его строка StoredImage удалилась с refs <= 0.
+    """
+    storage = get_storage()
+    if modified_at(storage, name) > threshold:
+        return False
+    rows = StoredImage.objects.filter(name=name)
+    if rows.exists():
+        deleted, _ = rows.filter(refs__lte=0).delete()
+        if not deleted:
+            return False
+    elif Post.objects.filter(image=name).exists():
+        return False
+    storage.delete(name)
+    images.drop_thumbnails(name)
+    return True
+
+
+def collect_orphans(grace=None, dry_run=False):
+    """Удаляет файлы без ссылок и возвращает их имена.
+
+    Файл, измененный позже чем grace секунд назад, не трогаем: повторная
+    загрузка тех же байтов обновляет дату изменения (см. posts.storage)
+    еще до того, как пост со ссылкой на файл будет сохранен.
+    """
+    if grace is None:
+        grace = settings.MEDIA_GC_GRACE_SECONDS
+    storage = get_storage()
+    threshold = time.time() - grace
+    orphans = StoredImage.objects.filter(refs__lte=0).values_list(
+        "name", flat=True
+    )
+    removed = []
+    for name in orphans.iterator():
+        if dry_run:
+            if modified_at(storage, name) <= threshold:
+                removed.append(name)
+        elif remove_unreferenced(name, threshold):
+            removed.append(name)
+    return removed
@@ -0,0 +1,85 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_by(queryset, field):
+    return dict(
+        queryset.values_list(field).annotate(total=Count("pk")).order_by()
+    )
+
+
+def fill_counters(apps, schema_editor):
+    AuthorStats = apps.get_model("posts", "AuthorStats")
+    Comment = apps.get_model("posts", "Comment")
+    Follow = apps.get_model("posts", "Follow")
+    Post = apps.get_model("posts", "Post")
+
+    posts = count_by(Post.objects, "author_id")
+    followers = count_by(Follow.objects, "author_id")
+    following = count_by(Follow.objects, "user_id")
+    AuthorStats.objects.bulk_create(
+        [
+            AuthorStats(
+                user_id=user_id,
+                posts_count=posts.get(user_id, 0),
+                followers_count=followers.get(user_id, 0),
+                following_count=following.get(user_id, 0),
+            )
+            for user_id in {*posts, *followers, *following}
+        ]
+    )
+    for post_id, total in count_by(Comment.objects, "post_id").items():
+        Post.objects.filter(pk=post_id).update(comments_count=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("posts", "0011_post_updated"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AuthorStats",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Пользователь",
+                    ),
+                ),
+                (
+                    "posts_count",
+                    models.IntegerField(default=0, verbose_name="Постов"),
+                ),
+                (
+                    "followers_count",
+                    models.IntegerField(default=0, verbose_name="Подписчиков"),
+                ),
+                (
+                    "following_count",
+                    models.IntegerField(default=0, verbose_name="Подписок"),
+                ),
+            ],
+            options={
+                "verbose_name": "Статистика автора",
+                "verbose_name_plural": "Статистика авторов",
+            },
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="comments_count",
+            field=models.IntegerField(default=0, verbose_name="Комментариев"),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
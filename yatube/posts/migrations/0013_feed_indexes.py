@@ -0,0 +1,91 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:15
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min
+
+
+def remove_duplicate_follows(apps, schema_editor):
+    AuthorStats = apps.get_model("posts", "AuthorStats")
+    Follow = apps.get_model("posts", "Follow")
+
+    duplicates = (
+        Follow.objects.values("user_id", "author_id")
+        .annotate(first=Min("pk"), total=Count("pk"))
+        .filter(total__gt=1)
+        .order_by()
+    )
+    for row in duplicates:
+        extra = row["total"] - 1
+        Follow.objects.filter(
+            user_id=row["user_id"], author_id=row["author_id"]
+        ).exclude(pk=row["first"]).delete()
+        AuthorStats.objects.filter(user_id=row["author_id"]).update(
+            followers_count=F("followers_count") - extra
+        )
+        AuthorStats.objects.filter(user_id=row["user_id"]).update(
+            following_count=F("following_count") - extra
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0012_authorstats"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="comment",
+            options={"ordering": ["created", "id"]},
+        ),
+        migrations.AlterModelOptions(
+            name="post",
+            options={
+                "ordering": ["-pub_date", "-id"],
+                "verbose_name": "Пост",
+                "verbose_name_plural": "Посты",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                fields=["post", "created", "id"],
+                name="posts_comment_post_date_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="follow",
+            index=models.Index(
+                fields=["author", "user"], name="posts_follow_author_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                fields=["-pub_date", "-id"], name="posts_post_pub_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                fields=["group", "-pub_date", "-id"],
+                name="posts_post_group_date_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                fields=["author", "-pub_date", "-id"],
+                name="posts_post_author_date_idx",
+            ),
+        ),
+        migrations.RunPython(
+            remove_duplicate_follows, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name="follow",
+            constraint=models.UniqueConstraint(
+                fields=("user", "author"), name="posts_follow_unique"
+            ),
+        ),
+    ]
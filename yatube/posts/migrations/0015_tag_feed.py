@@ -0,0 +1,95 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:30
+
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Subquery
+
+
+def merge_duplicate_tags(apps, schema_editor):
+    Tag = apps.get_model("posts", "Tag")
+    TagPost = apps.get_model("posts", "TagPost")
+
+    duplicates = (
+        Tag.objects.values("name")
+        .annotate(first=Min("pk"), total=Count("pk"))
+        .filter(total__gt=1)
+        .order_by()
+    )
+    for row in duplicates:
+        extra = Tag.objects.filter(name=row["name"]).exclude(pk=row["first"])
+        TagPost.objects.filter(tag__in=extra).update(tag_id=row["first"])
+        extra.delete()
+
+    duplicates = (
+        TagPost.objects.values("tag_id", "post_id")
+        .annotate(first=Min("pk"), total=Count("pk"))
+        .filter(total__gt=1)
+        .order_by()
+    )
+    for row in duplicates:
+        TagPost.objects.filter(
+            tag_id=row["tag_id"], post_id=row["post_id"]
+        ).exclude(pk=row["first"]).delete()
+
+
+def fill_tag_stats(apps, schema_editor):
+    Post = apps.get_model("posts", "Post")
+    Tag = apps.get_model("posts", "Tag")
+    TagPost = apps.get_model("posts", "TagPost")
+
+    TagPost.objects.update(
+        pub_date=Subquery(
+            Post.objects.filter(pk=OuterRef("post_id")).values("pub_date")
+        )
+    )
+    counts = (
+        TagPost.objects.values("tag_id").annotate(total=Count("pk")).order_by()
+    )
+    for row in counts:
+        Tag.objects.filter(pk=row["tag_id"]).update(posts_count=row["total"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0014_post_search"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tag",
+            name="posts_count",
+            field=models.IntegerField(default=0, verbose_name="Постов"),
+        ),
+        migrations.AddField(
+            model_name="tagpost",
+            name="pub_date",
+            field=models.DateTimeField(
+                null=True, verbose_name="Дата публикации"
+            ),
+        ),
+        migrations.RunPython(merge_duplicate_tags, migrations.RunPython.noop),
+        migrations.RunPython(fill_tag_stats, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="tagpost",
+            name="pub_date",
+            field=models.DateTimeField(verbose_name="Дата публикации"),
+        ),
+        migrations.AlterField(
+            model_name="tag",
+            name="name",
+            field=models.CharField(max_length=32, unique=True),
+        ),
+        migrations.AddConstraint(
+            model_name="tagpost",
+            constraint=models.UniqueConstraint(
+                fields=("tag", "post"), name="posts_tagpost_unique"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="tagpost",
+            index=models.Index(
+                fields=["tag", "-pub_date", "-post"],
+                name="posts_tagpost_tag_date_idx",
+            ),
+        ),
+    ]
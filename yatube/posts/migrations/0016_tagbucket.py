@@ -0,0 +1,61 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0015_tag_feed"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TagBucket",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "bucket",
+                    models.DateTimeField(verbose_name="Начало интервала"),
+                ),
+                (
+                    "count",
+                    models.IntegerField(default=0, verbose_name="Постов"),
+                ),
+                (
+                    "tag",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="buckets",
+                        to="posts.Tag",
+                        verbose_name="Тег",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Интервал тега",
+                "verbose_name_plural": "Интервалы тегов",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="tagbucket",
+            index=models.Index(
+                fields=["bucket"], name="posts_tagbucket_bucket_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="tagbucket",
+            constraint=models.UniqueConstraint(
+                fields=("tag", "bucket"), name="posts_tagbucket_unique"
+            ),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0016_tagbucket"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="image_width",
+            field=models.PositiveIntegerField(
+                blank=True,
+                editable=False,
+                null=True,
+                verbose_name="Ширина картинки",
+            ),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="image_height",
+            field=models.PositiveIntegerField(
+                blank=True,
+                editable=False,
+                null=True,
+                verbose_name="Высота картинки",
+            ),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="image_size",
+            field=models.PositiveIntegerField(
+                blank=True,
+                editable=False,
+                null=True,
+                verbose_name="Размер картинки, байт",
+            ),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="image_format",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                max_length=10,
+                verbose_name="Формат картинки",
+            ),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="image_hash",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                max_length=64,
+                verbose_name="SHA-256 картинки",
+            ),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="image_placeholder",
+            field=models.TextField(
+                blank=True, editable=False, verbose_name="Заглушка картинки"
+            ),
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:39
+
+from django.db import migrations, models
+from django.db.models import Count
+
+import posts.storage
+
+
+def count_image_refs(apps, schema_editor):
+    Post = apps.get_model("posts", "Post")
+    StoredImage = apps.get_model("posts", "StoredImage")
+
+    counts = (
+        Post.objects.exclude(image="")
+        .filter(image__startswith="posts/")
+        .values_list("image")
+        .annotate(total=Count("pk"))
+        .order_by()
+    )
+    StoredImage.objects.bulk_create(
+        StoredImage(name=name, refs=total) for name, total in counts
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0017_post_image_metadata"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StoredImage",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "name",
+                    models.CharField(
+                        max_length=100, unique=True, verbose_name="Файл"
+                    ),
+                ),
+                (
+                    "refs",
+                    models.IntegerField(default=0, verbose_name="Ссылок"),
+                ),
+            ],
+            options={
+                "verbose_name": "Файл картинки",
+                "verbose_name_plural": "Файлы картинок",
+            },
+        ),
+        migrations.AlterField(
+            model_name="post",
+            name="image",
+            field=models.ImageField(
+                blank=True,
+                storage=posts.storage.ContentAddressedStorage(),
+                upload_to="posts/",
+                verbose_name="Картинка",
+            ),
+        ),
+        migrations.RunPython(count_image_refs, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="storedimage",
+            index=models.Index(
+                fields=["refs"], name="posts_storedimage_refs_idx"
+            ),
+        ),
+    ]
@@ -1,7 +1,10 @@
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 
+from .storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
@@ -14,7 +17,8 @@ class Group(models.Model):
         return self.title
 
 class Tag(models.Model):
-    name = models.CharField(max_length=32)
+    name = models.CharField(max_length=32, unique=True)
+    posts_count = models.IntegerField("Постов", default=0)
 
     def __str__(self):
         return self.name
@@ -22,6 +26,7 @@ class Tag(models.Model):
 class Post(models.Model):
     text = models.TextField("Текст поста", help_text="Введите текст поста")
     pub_date = models.DateTimeField("Дата публикации", auto_now_add=True)
+    updated = models.DateTimeField("Дата изменения", auto_now=True)
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -37,14 +42,57 @@ class Post(models.Model):
         verbose_name="Группа",
         help_text="Группа, к которой будет относиться пост",
     )
-    image = models.ImageField("Картинка", upload_to="posts/", blank=True)
+    image = models.ImageField(
+        "Картинка",
+        upload_to="posts/",
+        storage=ContentAddressedStorage(),
+        blank=True,
+    )
+    # сведения о картинке снимаются при загрузке (posts.images.describe),
+    # чтобы при выводе ленты не открывать файл
+    image_width = models.PositiveIntegerField(
+        "Ширина картинки", null=True, blank=True, editable=False
+    )
+    image_height = models.PositiveIntegerField(
+        "Высота картинки", null=True, blank=True, editable=False
+    )
+    image_size = models.PositiveIntegerField(
+        "Размер картинки, байт", null=True, blank=True, editable=False
+    )
+    image_format = models.CharField(
+        "Формат картинки", max_length=10, blank=True, editable=False
+    )
+    image_hash = models.CharField(
+        "SHA-256 картинки", max_length=64, blank=True, editable=False
+    )
+    image_placeholder = models.TextField(
+        "Заглушка картинки", blank=True, editable=False
+    )
     tag = models.ManyToManyField(Tag, through='TagPost')
+    comments_count = models.IntegerField("Комментариев", default=0)
+    # заполняется только на PostgreSQL, см. posts.search
+    search_vector = SearchVectorField(
+        "Поисковый вектор", null=True, blank=True, editable=False
+    )
 
     def __str__(self):
         return self.text[: settings.CHAR_IN_WORD]
 
     class Meta:
-        ordering = ["-pub_date"]
+        ordering = ["-pub_date", "-id"]
+        indexes = [
+            models.Index(
+                fields=["-pub_date", "-id"], name="posts_post_pub_date_idx"
+            ),
+            models.Index(
+                fields=["group", "-pub_date", "-id"],
+                name="posts_post_group_date_idx",
+            ),
+            models.Index(
+                fields=["author", "-pub_date", "-id"],
+                name="posts_post_author_date_idx",
+            ),
+        ]
         verbose_name = "Пост"
         verbose_name_plural = "Посты"
 
@@ -67,6 +115,15 @@ class Comment(models.Model):
     )
     created = models.DateTimeField("Дата публикации", auto_now_add=True)
 
+    class Meta:
+        ordering = ["created", "id"]
+        indexes = [
+            models.Index(
+                fields=["post", "created", "id"],
+                name="posts_comment_post_date_idx",
+            ),
+        ]
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -82,9 +139,138 @@ class Follow(models.Model):
         related_name="following",
     )
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "author"], name="posts_follow_unique"
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["author", "user"], name="posts_follow_author_idx"
+            ),
+        ]
+
 class TagPost(models.Model):
     tag = models.ForeignKey(Tag, on_delete=models.CASCADE)
     post = models.ForeignKey(Post, on_delete=models.CASCADE)
+    # копия Post.pub_date, чтобы лента тега читалась по индексу
+    pub_date = models.DateTimeField("Дата публикации")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["tag", "post"], name="posts_tagpost_unique"
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["tag", "-pub_date", "-post"],
+                name="posts_tagpost_tag_date_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.tag} {self.post}'
+
+
+class TagBucket(models.Model):
+    """Число новых постов с тегом за интервал TRENDING_BUCKET_SECONDS."""
+
+    tag = models.ForeignKey(
+        Tag,
+        on_delete=models.CASCADE,
+        verbose_name="Тег",
+        related_name="buckets",
+    )
+    bucket = models.DateTimeField("Начало интервала")
+    count = models.IntegerField("Постов", default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["tag", "bucket"], name="posts_tagbucket_unique"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["bucket"], name="posts_tagbucket_bucket_idx"),
+        ]
+        verbose_name = "Интервал тега"
+        verbose_name_plural = "Интервалы тегов"
+
+
+class FeedEntry(models.Model):
+    """Запись материализованной ленты подписок читателя."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name="Читатель",
+        related_name="feed",
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        verbose_name="Пост",
+        related_name="feed_entries",
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name="Автор",
+        related_name="+",
+    )
+    pub_date = models.DateTimeField("Дата публикации")
+
+    class Meta:
+        unique_together = ("user", "post")
+        indexes = [
+            models.Index(
+                fields=["user", "-pub_date", "-post"],
+                name="posts_feed_user_date_idx",
+            ),
+            models.Index(
+                fields=["user", "author"], name="posts_feed_user_author_idx"
+            ),
+        ]
+        verbose_name = "Запись ленты"
+        verbose_name_plural = "Лента подписок"
+
+
+class AuthorStats(models.Model):
+    """Счетчики пользователя, которые поддерживаются при изменениях."""
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        verbose_name="Пользователь",
+        related_name="stats",
+    )
+    posts_count = models.IntegerField("Постов", default=0)
+    followers_count = models.IntegerField("Подписчиков", default=0)
+    following_count = models.IntegerField("Подписок", default=0)
+
+    class Meta:
+        verbose_name = "Статистика автора"
+        verbose_name_plural = "Статистика авторов"
 
     def __str__(self):
-        return f'{self.tag} {self.post}'
\ No newline at end of file
+        return str(self.user)
+
+
+class StoredImage(models.Model):
+    """Сколько постов ссылается на файл картинки в хранилище."""
+
+    name = models.CharField("Файл", max_length=100, unique=True)
+    refs = models.IntegerField("Ссылок", default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["refs"], name="posts_storedimage_refs_idx"),
+        ]
+        verbose_name = "Файл картинки"
+        verbose_name_plural = "Файлы картинок"
+
+    def __str__(self):
+        return self.name
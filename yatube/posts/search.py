@@ -0,0 +1,131 @@
+"""Полнотекстовый поиск по постам.
+
+На PostgreSQL документ поста хранится в Post.search_vector под GIN-индексом
+и ранжируется SearchRank. На SQLite тот же текст дублируется в теневую
+таблицу FTS5 posts_post_fts (rowid = id поста) и ранжируется bm25. Обе
+копии обновляются сигналами при сохранении и удалении поста.
+"""
+import binascii
+import re
+from typing import Any, NamedTuple, Optional
+
+from django.conf import settings
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+)
+from django.db import connection
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
+
+from . import utils
+from .models import Post
+
+SEARCH_CONFIG = "russian"
+FTS_TABLE = "posts_post_fts"
+
+WORD_RE = re.compile(r"\w+")
+
+
+class SearchCursor(NamedTuple):
+    rank: float
+    pk: int
+
+
+def is_postgres():
+    return connection.vendor == "postgresql"
+
+
+def index_post(post):
+    if is_postgres():
+        Post.objects.filter(pk=post.pk).update(
+            search_vector=SearchVector("text", config=SEARCH_CONFIG)
+        )
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [post.pk])
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)",
+            [post.pk, post.text],
+        )
+
+
+def unindex_post(post_id):
+    if is_postgres():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [post_id])
+
+
+def fts_query(query: str) -> str:
+    """Запрос FTS5 из слов пользователя: все слова, каждое как префикс."""
+    return " ".join(f'"{word}"*' for word in WORD_RE.findall(query))
+
+
+def search_posts(posts, query: str):
+    """Посты, подходящие под запрос, с релевантностью в аннотации rank."""
+    if is_postgres():
+        search_query = SearchQuery(query, config=SEARCH_CONFIG)
+        # ts_rank возвращает real; курсор хранит rank как double, и без
+        # приведения равенство на границе страницы не выполняется
+        return posts.filter(search_vector=search_query).annotate(
+            rank=Cast(
+                SearchRank(F("search_vector"), search_query), FloatField()
+            )
+        )
+
+    match = fts_query(query)
+    if not match:
+        return posts.annotate(rank=Value(0.0, FloatField())).none()
+    # RawSQL в pk__in получает двойные скобки, и SQLite сравнивает id
+    # только с первой строкой подзапроса, поэтому условие задано через extra
+    return posts.extra(
+        where=[
+            f"posts_post.id IN (SELECT rowid FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s)"
+        ],
+        params=[match],
+    ).annotate(
+        rank=RawSQL(
+            f"SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s AND rowid = posts_post.id",
+            [match],
+            output_field=FloatField(),
+        )
+    )
+
+
+def encode_search_cursor(post) -> str:
+    return utils.pack_cursor(repr(post.rank), post.pk)
+
+
+def decode_search_cursor(value: Optional[str]) -> Optional[SearchCursor]:
+    if not value:
+        return None
+    try:
+        rank, pk = utils.unpack_cursor(value)
+        return SearchCursor(float(rank), int(pk))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+def get_search_page(query: str, cursor: Optional[SearchCursor]) -> Any:
+    """Страница результатов по убыванию rank, затем id.
+
+    Следующая страница выбирается по ключу (rank, id), поэтому глубокие
+    страницы не требуют OFFSET.
+    """
+    posts = search_posts(utils.with_feed_related(Post.objects.all()), query)
+    if cursor is not None:
+        posts = posts.filter(
+            Q(rank__lt=cursor.rank) | Q(rank=cursor.rank, pk__lt=cursor.pk)
+        )
+    limit = settings.POST_ON_PAGE
+    rows = list(posts.order_by("-rank", "-pk")[: limit + 1])
+    older_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        older_cursor = encode_search_cursor(rows[-1])
+    return utils.CursorPage(rows, older_cursor=older_cursor)
@@ -0,0 +1,203 @@
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import feed, media, search, tags, thumbnails, trending
+from .caching import TAG_CLOUD_KEY, bump_feed_version
+from .counters import (
+    adjust_author_stats,
+    adjust_comments_count,
+    adjust_tag_count,
+)
+from .models import Comment, Follow, Group, Post, TagPost, User
+
+
+@receiver(post_save, sender=Post)
+def count_created_post(sender, instance, created, **kwargs):
+    if created:
+        adjust_author_stats(instance.author_id, posts_count=1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    adjust_author_stats(instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def count_created_comment(sender, instance, created, **kwargs):
+    if created:
+        adjust_comments_count(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    adjust_comments_count(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_created_follow(sender, instance, created, **kwargs):
+    if created:
+        adjust_author_stats(instance.author_id, followers_count=1)
+        adjust_author_stats(instance.user_id, following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    adjust_author_stats(instance.author_id, followers_count=-1)
+    adjust_author_stats(instance.user_id, following_count=-1)
+
+
+@receiver(post_save, sender=TagPost)
+def count_created_tag_post(sender, instance, created, **kwargs):
+    if created:
+        adjust_tag_count(instance.tag_id, 1)
+        trending.count_tags([(instance.tag_id, instance.pub_date)], 1)
+
+
+@receiver(post_delete, sender=TagPost)
+def count_deleted_tag_post(sender, instance, **kwargs):
+    adjust_tag_count(instance.tag_id, -1)
+    trending.count_tags([(instance.tag_id, instance.pub_date)], -1)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if created:
+        feed.fan_out(instance)
+
+
+@receiver(pre_save, sender=Post)
+def remember_saved_fields(sender, instance, **kwargs):
+    saved = (
+        Post.objects.filter(pk=instance.pk)
+        .values_list("group_id", "image")
+        .first()
+        if instance.pk
+        else None
+    )
+    instance._saved_group_id, instance._saved_image = saved or (None, "")
+
+
+@receiver(post_save, sender=Post)
+def queue_thumbnails(sender, instance, **kwargs):
+    name = instance.image.name
+    if name and name != getattr(instance, "_saved_image", ""):
+        thumbnails.schedule(name)
+
+
+@receiver(post_save, sender=Post)
+def count_image_refs(sender, instance, **kwargs):
+    name = instance.image.name or ""
+    saved = getattr(instance, "_saved_image", "")
+    if name != saved:
+        media.adjust_refs(name, 1)
+        media.adjust_refs(saved, -1)
+
+
+@receiver(post_delete, sender=Post)
+def release_image(sender, instance, **kwargs):
+    media.adjust_refs(instance.image.name, -1)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def bump_post_feeds(sender, instance, **kwargs):
+    bump_feed_version("index")
+    bump_feed_version("profile", instance.author_id)
+    group_ids = {instance.group_id, getattr(instance, "_saved_group_id", None)}
+    for group_id in group_ids - {None}:
+        bump_feed_version("group", group_id)
+    # При удалении поста версии тегов сбрасывают удаляемые строки TagPost
+    if kwargs.get("created") is False:
+        tag_ids = TagPost.objects.filter(post=instance).values_list(
+            "tag_id", flat=True
+        )
+        for tag_id in tag_ids:
+            bump_feed_version("tag", tag_id)
+
+
+@receiver(pre_save, sender=TagPost)
+def copy_pub_date(sender, instance, **kwargs):
+    if instance.pub_date is None:
+        instance.pub_date = instance.post.pub_date
+
+
+@receiver(post_save, sender=TagPost)
+@receiver(post_delete, sender=TagPost)
+def bump_tag_feeds(sender, instance, **kwargs):
+    bump_feed_version("tag", instance.tag_id)
+    cache.delete(TAG_CLOUD_KEY)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or "text" in update_fields:
+        search.index_post(instance)
+
+
+@receiver(post_save, sender=Post)
+def sync_post_tags(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or "text" in update_fields:
+        tags.sync_tags([instance])
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.unindex_post(instance.pk)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_feed(sender, instance, created, **kwargs):
+    if created:
+        feed.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_feed(sender, instance, **kwargs):
+    feed.prune(instance.user_id, instance.author_id)
+    feed.catch_up(instance.author_id)
+
+
+CARD_USER_FIELDS = ("username", "first_name", "last_name")
+
+
+@receiver(pre_save, sender=User)
+def remember_card_fields(sender, instance, update_fields=None, **kwargs):
+    # вход в систему сохраняет только last_login
+    if not instance.pk or (
+        update_fields is not None
+        and not set(update_fields) & set(CARD_USER_FIELDS)
+    ):
+        instance._saved_card_fields = None
+        return
+    instance._saved_card_fields = (
+        User.objects.filter(pk=instance.pk)
+        .values_list(*CARD_USER_FIELDS)
+        .first()
+    )
+
+
+@receiver(post_save, sender=User)
+def bump_user_cards(sender, instance, created, **kwargs):
+    saved = getattr(instance, "_saved_card_fields", None)
+    current = tuple(getattr(instance, field) for field in CARD_USER_FIELDS)
+    if not created and saved is not None and saved != current:
+        bump_feed_version("cards")
+
+
+@receiver(pre_save, sender=Group)
+def remember_group_slug(sender, instance, **kwargs):
+    instance._saved_slug = (
+        Group.objects.filter(pk=instance.pk)
+        .values_list("slug", flat=True)
+        .first()
+        if instance.pk
+        else None
+    )
+
+
+@receiver(post_save, sender=Group)
+def bump_group_cards(sender, instance, created, **kwargs):
+    saved = getattr(instance, "_saved_slug", None)
+    if not created and saved is not None and saved != instance.slug:
+        bump_feed_version("cards")
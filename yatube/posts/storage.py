@@ -0,0 +1,68 @@
+"""Хранилище картинок постов с адресацией по содержимому.
+
+Файл называется по sha256 своих байтов и кладется в каталог upload_to,
+разложенный по подкаталогам ab/cd/, например posts/ab/cd/<sha256>.jpg.
+Одинаковые загрузки поэтому хранятся один раз, а в одном каталоге не
+скапливаются сотни тысяч файлов. Сколько постов ссылается на файл,
+считает StoredImage (см. posts.media); файлы без ссылок удаляет команда
+collect_media.
+"""
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def hashed_name(self, name, content):
+        directory, filename = posixpath.split(name.replace("\\", "/"))
+        extension = os.path.splitext(filename)[1].lower()
+        digest = content_hash(content)
+        return posixpath.join(
+            directory, digest[:2], digest[2:4], f"{digest}{extension}"
+        )
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            # те же байты уже лежат на диске; свежая дата изменения
+            # не дает collect_media удалить файл, пока пост сохраняется
+            os.utime(self.path(name))
+            return name
+        return self._save(name, content)
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        # параллельная загрузка тех же байтов пишет тот же файл, поэтому
+        # достаточно атомарной замены вместо подбора свободного имени
+        handle, temporary = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(handle, "wb") as file:
+                for chunk in content.chunks():
+                    file.write(chunk)
+            os.chmod(temporary, self.file_permissions_mode or 0o644)
+            os.replace(temporary, full_path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+        return name
@@ -0,0 +1,82 @@
+"""Хештеги из текста поста.
+
+Теги разрешаются пачкой: один запрос на поиск существующих и один
+bulk_create(ignore_conflicts=True) для новых. Связи TagPost сравниваются с
+уже сохраненными, поэтому правка поста трогает только изменившиеся теги.
+"""
+import re
+from collections import Counter
+
+from django.core.cache import cache
+
+from . import trending
+from .caching import TAG_CLOUD_KEY, bump_feed_version
+from .counters import adjust_tag_count
+from .models import Tag, TagPost
+
+HASHTAG_RE = re.compile(r"#(\w+)")
+TAG_MAX_LENGTH = Tag._meta.get_field("name").max_length
+
+
+def extract_tags(text):
+    """Имена хештегов текста в порядке появления, без повторов."""
+    names = (name.lower() for name in HASHTAG_RE.findall(text))
+    return list(
+        dict.fromkeys(name for name in names if len(name) <= TAG_MAX_LENGTH)
+    )
+
+
+def resolve_tags(names):
+    """Словарь имя -> id тега; недостающие теги создаются."""
+    if not names:
+        return {}
+    tags = dict(Tag.objects.filter(name__in=names).values_list("name", "pk"))
+    missing = [name for name in names if name not in tags]
+    if missing:
+        Tag.objects.bulk_create(
+            [Tag(name=name) for name in missing], ignore_conflicts=True
+        )
+        tags.update(
+            Tag.objects.filter(name__in=missing).values_list("name", "pk")
+        )
+    return tags
+
+
+def sync_tags(posts):
+    """Приводит связи TagPost постов к хештегам их текста."""
+    post_tags = {post.pk: extract_tags(post.text) for post in posts}
+    tag_ids = resolve_tags(
+        list({name for names in post_tags.values() for name in names})
+    )
+    current = {}
+    links = TagPost.objects.filter(post_id__in=post_tags)
+    for pk, post_id, tag_id in links.values_list("pk", "post_id", "tag_id"):
+        current.setdefault(post_id, {})[tag_id] = pk
+
+    added = []
+    stale = []
+    for post in posts:
+        wanted = {tag_ids[name] for name in post_tags[post.pk]}
+        saved = current.get(post.pk, {})
+        added.extend(
+            TagPost(tag_id=tag_id, post_id=post.pk, pub_date=post.pub_date)
+            for tag_id in wanted - saved.keys()
+        )
+        stale.extend(
+            pk for tag_id, pk in saved.items() if tag_id not in wanted
+        )
+
+    if added:
+        TagPost.objects.bulk_create(added, ignore_conflicts=True)
+        # bulk_create не шлет сигналы, поэтому счетчики и версии лент
+        # обновляются здесь
+        for tag_id, count in Counter(item.tag_id for item in added).items():
+            adjust_tag_count(tag_id, count)
+            bump_feed_version("tag", tag_id)
+        cache.delete(TAG_CLOUD_KEY)
+        trending.count_tags(
+            [(item.tag_id, item.pub_date) for item in added], 1
+        )
+    if stale:
+        # удаление через QuerySet шлет post_delete для каждой связи
+        TagPost.objects.filter(pk__in=stale).delete()
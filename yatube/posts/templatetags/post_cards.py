@@ -0,0 +1,31 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from ..caching import CARD_TEMPLATE, card_key
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_cards(posts, template_name=CARD_TEMPLATE):
+    """Возвращает HTML карточек постов страницы.
+
+    Готовые карточки читаются из кеша одним get_many, а рендерятся только
+    отсутствующие. Ключ содержит дату изменения поста, поэтому правка
+    поста сразу дает новую карточку.
+    """
+    posts = list(posts)
+    keys = [card_key(post, template_name) for post in posts]
+    cards = cache.get_many(keys)
+    missing = {
+        key: render_to_string(template_name, {"post": post})
+        for key, post in zip(keys, posts)
+        if key not in cards
+    }
+    if missing:
+        cache.set_many(missing, settings.FEED_CACHE_TIMEOUT)
+        cards.update(missing)
+    return [mark_safe(cards[key]) for key in keys]
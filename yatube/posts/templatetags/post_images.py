@@ -0,0 +1,38 @@
+from django import template
+from django.conf import settings
+from django.urls import reverse
+
+from ..images import target_size
+
+register = template.Library()
+
+
+def image_widths(image):
+    """Ширины копий не больше оригинала; без метаданных — все ширины."""
+    original = getattr(image.instance, "image_width", None)
+    widths = list(settings.POST_IMAGE_WIDTHS)
+    if not original:
+        return widths
+    return [width for width in widths if width <= original] or widths[:1]
+
+
+@register.simple_tag
+def image_url(image, width=None):
+    """Адрес уменьшенной копии картинки; сама картинка не читается."""
+    width = width or min(settings.POST_IMAGE_WIDTH, image_widths(image)[-1])
+    return reverse(
+        "posts:thumbnail", kwargs={"width": width, "path": image.name}
+    )
+
+
+@register.simple_tag
+def image_srcset(image):
+    return ", ".join(
+        f"{image_url(image, width)} {width}w" for width in image_widths(image)
+    )
+
+
+@register.simple_tag
+def image_box():
+    """Ширина и высота копии в карточке, чтобы разметка не прыгала."""
+    return target_size(settings.POST_IMAGE_WIDTH)
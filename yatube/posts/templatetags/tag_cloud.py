@@ -0,0 +1,43 @@
+import math
+
+from core.stampede import get_or_compute
+from django import template
+from django.conf import settings
+
+from .. import trending
+from ..caching import TAG_CLOUD_KEY
+from ..models import Tag
+
+register = template.Library()
+
+
+def build_tag_cloud():
+    tags = list(
+        Tag.objects.filter(posts_count__gt=0)
+        .order_by("-posts_count", "name")
+        .values("name", "posts_count")[: settings.TAG_CLOUD_SIZE]
+    )
+    top = math.log(max((tag["posts_count"] for tag in tags), default=1))
+    for tag in tags:
+        share = math.log(tag["posts_count"]) / top if top else 0
+        tag["weight"] = 1 + round(4 * share)
+    tags.sort(key=lambda tag: tag["name"])
+    return tags
+
+
+@register.inclusion_tag("includes/tag_cloud.html")
+def tag_cloud():
+    """Самые популярные теги по готовым счетчикам Tag.posts_count.
+
+    Список кешируется и сбрасывается при изменении связей TagPost, а вес
+    тега от 1 до 5 растет логарифмически с числом постов.
+    """
+    tags = get_or_compute(
+        TAG_CLOUD_KEY, build_tag_cloud, settings.FEED_CACHE_TIMEOUT
+    )
+    return {"tags": tags}
+
+
+@register.inclusion_tag("includes/trending_tags.html")
+def trending_tags():
+    return {"tags": trending.trending_tags()}
@@ -1,10 +1,21 @@
+import hashlib
+import io
 import shutil
 import tempfile
+from urllib.parse import urlsplit
 
+from core.query_budget import (
+    QueryBudgetExceeded,
+    check_query_budget,
+    get_query_budget,
+)
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import Client, TestCase, override_settings
-from django.urls import reverse
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from PIL import Image
 
 from ..models import Comment, Group, Post, User
 
@@ -28,6 +39,9 @@ class BaseTestCase(TestCase):
         cls.uploaded = SimpleUploadedFile(
             name="small.gif", content=cls.small_gif, content_type="image/gif"
         )
+        digest = hashlib.sha256(cls.small_gif).hexdigest()
+        # картинки хранятся под sha256 содержимого, см. posts.storage
+        cls.image_name = f"posts/{digest[:2]}/{digest[2:4]}/{digest}.gif"
 
         cls.user = User.objects.create_user(username="test_user")
         cls.group = Group.objects.create(
@@ -111,6 +125,25 @@ class BaseTestCase(TestCase):
             ),
         }
 
+    def assertWithinQueryBudget(self, client, url):
+        view_name = resolve(urlsplit(url).path).view_name
+        self.assertIsNotNone(
+            get_query_budget(view_name), f"Нет бюджета для {view_name}"
+        )
+        with CaptureQueriesContext(connection) as queries:
+            client.get(url)
+        try:
+            check_query_budget(view_name, queries.captured_queries)
+        except QueryBudgetExceeded as error:
+            self.fail(str(error))
+
+    @staticmethod
+    def make_image(color, size=(2, 1), fmt="PNG"):
+        """Байты отдельной картинки, не совпадающие с small_gif."""
+        buffer = io.BytesIO()
+        Image.new("RGB", size, color).save(buffer, fmt)
+        return buffer.getvalue()
+
     @classmethod
     def tearDownClass(self):
         super().tearDownClass()
@@ -0,0 +1,76 @@
+from io import StringIO
+
+from django.core.management import call_command
+
+from ..counters import get_author_stats
+from ..models import AuthorStats, Post, Tag, TagPost, User
+from .base_testcase import BaseTestCase
+
+
+class CountersTest(BaseTestCase):
+    def assert_stats(self, user, **expected):
+        stats = get_author_stats(user)
+        for field, value in expected.items():
+            with self.subTest(field=field):
+                self.assertEqual(getattr(stats, field), value)
+
+    def test_post_count_follows_create_and_delete(self):
+        """Счетчик постов автора меняется при создании и удалении."""
+        post = Post.objects.create(author=self.user, text="Еще пост")
+        self.assert_stats(self.user, posts_count=2)
+
+        post.delete()
+        self.assert_stats(self.user, posts_count=1)
+
+    def test_comment_count_updated_by_add_comment(self):
+        """add_comment увеличивает счетчик комментариев поста."""
+        self.authorized_client.post(
+            self.post_detail_url + "comment/", {"text": "Комментарий"}
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 2)
+
+    def test_follow_counts(self):
+        """Подписка и отписка меняют счетчики обоих пользователей."""
+        self.auth_other_user.get(self.profile_follow_url)
+        self.assert_stats(self.user, followers_count=1)
+        self.assert_stats(self.other_user, following_count=1)
+
+        self.auth_other_user.get(self.profile_unfollow_url)
+        self.assert_stats(self.user, followers_count=0)
+        self.assert_stats(self.other_user, following_count=0)
+
+    def test_cascade_delete_updates_counts(self):
+        """Удаление подписчика уменьшает счетчик подписчиков автора."""
+        self.auth_other_user.get(self.profile_follow_url)
+        User.objects.get(pk=self.other_user.pk).delete()
+        self.assert_stats(self.user, followers_count=0)
+
+    def test_tag_count_follows_tag_posts(self):
+        """Счетчик постов тега меняется вместе со связями и постами."""
+        tag = Tag.objects.create(name="тег")
+        post = Post.objects.create(author=self.user, text="Еще пост")
+        TagPost.objects.create(tag=tag, post=self.post)
+        TagPost.objects.create(tag=tag, post=post)
+        tag.refresh_from_db()
+        self.assertEqual(tag.posts_count, 2)
+
+        post.delete()
+        tag.refresh_from_db()
+        self.assertEqual(tag.posts_count, 1)
+
+    def test_rebuild_counters_command(self):
+        """Команда rebuild_counters восстанавливает счетчики."""
+        tag = Tag.objects.create(name="тег")
+        TagPost.objects.create(tag=tag, post=self.post)
+        AuthorStats.objects.all().delete()
+        Post.objects.update(comments_count=0)
+        Tag.objects.update(posts_count=0)
+
+        call_command("rebuild_counters", batch_size=1, stdout=StringIO())
+
+        self.assert_stats(self.user, posts_count=1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+        tag.refresh_from_db()
+        self.assertEqual(tag.posts_count, 1)
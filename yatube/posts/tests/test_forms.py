@@ -44,7 +44,7 @@ class PostFormTest(BaseTestCase):
         self.assertEqual(post_obj.text, form_data["text"])
         self.assertEqual(post_obj.group.id, form_data["group"])
         self.assertEqual(post_obj.author, self.user)
-        self.assertEqual(post_obj.image, "posts/small.gif")
+        self.assertEqual(post_obj.image, self.image_name)
 
     def test_post_create_form_anonim_user(self):
         """
@@ -99,10 +99,10 @@ class PostFormTest(BaseTestCase):
         self.assertRedirects(response, redirect_url)
         self.assertFalse(Post.objects.filter(text="Анонимный текст").exists())
 
-        @classmethod
-        def tearDownClass(self):
-            super().tearDownClass()
-            shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
 
 class CommentFormTest(BaseTestCase):
@@ -0,0 +1,79 @@
+import re
+
+from django.db import connection
+from django.test import TestCase
+
+from ..feed import PUSH, get_follow_feed
+from ..models import Comment, FeedEntry, Follow, Group, Post, User
+
+SEED_POSTS = 1000
+
+
+class FeedQueryPlanTest(TestCase):
+    """Горячие запросы лент читают индекс, а не сортируют таблицу."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username="author")
+        cls.reader = User.objects.create_user(username="reader")
+        cls.group = Group.objects.create(
+            title="Группа", slug="group", description="Описание"
+        )
+        Post.objects.bulk_create(
+            [
+                Post(
+                    author=cls.author,
+                    text=f"Пост {i}",
+                    group=cls.group if i % 3 else None,
+                )
+                for i in range(SEED_POSTS)
+            ]
+        )
+        cls.post = Post.objects.first()
+        Comment.objects.bulk_create(
+            [
+                Comment(post=cls.post, author=cls.reader, text=f"Текст {i}")
+                for i in range(SEED_POSTS // 10)
+            ]
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        FeedEntry.objects.bulk_create(
+            [
+                FeedEntry(
+                    user=cls.reader,
+                    post=post,
+                    author=cls.author,
+                    pub_date=post.pub_date,
+                )
+                for post in Post.objects.all()
+            ],
+            ignore_conflicts=True,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def assert_index_scan(self, queryset):
+        plan = queryset.explain()
+        if connection.vendor == "sqlite":
+            self.assertNotIn("TEMP B-TREE", plan)
+            self.assertIn("INDEX", plan)
+        elif connection.vendor == "postgresql":
+            self.assertIsNone(re.search(r"\bSort\b", plan), plan)
+            self.assertIn("Index", plan)
+        else:
+            self.skipTest(f"Нет проверки плана для {connection.vendor}")
+
+    def test_feed_queries_use_indexes(self):
+        queries = {
+            "index": Post.objects.select_related("group"),
+            "group_posts": self.group.posts.all(),
+            "profile": self.author.posts.all(),
+            "follow_index": get_follow_feed(self.reader, PUSH),
+            "comments": self.post.comments.all(),
+            "fan_out": Follow.objects.filter(author=self.author)
+            .order_by("user_id")
+            .values_list("user_id", flat=True),
+        }
+        for name, queryset in queries.items():
+            with self.subTest(query=name):
+                self.assert_index_scan(queryset[:10])
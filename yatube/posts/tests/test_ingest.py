@@ -0,0 +1,40 @@
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+
+from ..models import Post
+from .base_testcase import BaseTestCase
+
+
+class ImageIngestTest(BaseTestCase):
+    def upload(self, content, name="upload.png"):
+        image = SimpleUploadedFile(
+            name=name, content=content, content_type="image/png"
+        )
+        return self.authorized_client.post(
+            self.post_create_url, {"text": "Загрузка", "image": image}
+        )
+
+    def assertRejected(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context["form"].errors["image"])
+        self.assertFalse(Post.objects.filter(text="Загрузка").exists())
+
+    @override_settings(POST_IMAGE_MAX_SIDE=100)
+    def test_large_original_downscaled(self):
+        """Оригинал больше предела уменьшается до сохранения."""
+        self.upload(self.make_image("red", size=(300, 60)))
+        post = Post.objects.get(text="Загрузка")
+        self.assertEqual((post.image_width, post.image_height), (100, 20))
+        self.assertEqual(post.image.size, post.image_size)
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100)
+    def test_too_many_pixels_rejected(self):
+        self.assertRejected(self.upload(self.make_image("red", (20, 20))))
+
+    @override_settings(POST_IMAGE_MAX_BYTES=10)
+    def test_too_large_file_rejected(self):
+        self.assertRejected(self.upload(self.make_image("red")))
+
+    def test_unsupported_format_rejected(self):
+        content = self.make_image("red", fmt="BMP")
+        self.assertRejected(self.upload(content, name="upload.bmp"))
@@ -0,0 +1,142 @@
+import io
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.urls import reverse
+
+from .. import images
+from ..images import JPEG, cache_key, cache_path, get_thumbnail
+from ..maintenance import Progress
+from ..media import get_storage
+from ..models import Post, StoredImage
+from .base_testcase import BaseTestCase
+
+
+class ContentAddressedStorageTest(BaseTestCase):
+    def upload(self, text, name="same.png"):
+        image = SimpleUploadedFile(
+            name=name,
+            content=self.make_image("teal"),
+            content_type="image/png",
+        )
+        self.authorized_client.post(
+            self.post_create_url, {"text": text, "image": image}
+        )
+        return Post.objects.get(text=text)
+
+    def refs(self, name):
+        return StoredImage.objects.get(name=name).refs
+
+    def test_identical_uploads_share_one_file(self):
+        """Одинаковые байты хранятся один раз под именем из sha256."""
+        first = self.upload("Первый", name="a.png")
+        second = self.upload("Второй", name="B.PNG")
+        name = first.image.name
+        digest = first.image_hash
+        self.assertEqual(second.image.name, name)
+        self.assertEqual(
+            name, f"posts/{digest[:2]}/{digest[2:4]}/{digest}.png"
+        )
+        self.assertEqual(self.refs(name), 2)
+        directory = os.path.dirname(get_storage().path(name))
+        self.assertEqual(os.listdir(directory), [os.path.basename(name)])
+
+    def test_orphans_collected_after_edit_and_delete(self):
+        post = self.upload("Пост")
+        name = post.image.name
+        get_thumbnail(name, 480, JPEG)
+        self.authorized_client.post(
+            reverse("posts:post_edit", kwargs={"post_id": post.pk}),
+            {"text": "Пост", "image-clear": "on"},
+        )
+        self.assertEqual(self.refs(name), 0)
+
+        call_command(
+            "collect_media", "--dry-run", "--grace=0", stdout=io.StringIO()
+        )
+        self.assertTrue(get_storage().exists(name))
+
+        call_command("collect_media", "--grace=0", stdout=io.StringIO())
+        self.assertFalse(get_storage().exists(name))
+        self.assertFalse(StoredImage.objects.filter(name=name).exists())
+        self.assertFalse(
+            os.path.exists(cache_path(cache_key(name, 480, JPEG), JPEG))
+        )
+
+    def test_grace_period_keeps_fresh_orphans(self):
+        post = self.upload("Пост")
+        post.delete()
+        call_command("collect_media", stdout=io.StringIO())
+        self.assertTrue(get_storage().exists(post.image.name))
+
+
+class MaintainMediaTest(BaseTestCase):
+    def setUp(self):
+        self.storage = get_storage()
+        self.name = self.post.image.name
+        images.drop_thumbnails(self.name)
+        self.orphan = self.storage.save(
+            "posts/orphan.png", ContentFile(self.make_image("olive"))
+        )
+        os.utime(self.storage.path(self.orphan), (0, 0))
+
+    def thumbnail_paths(self, name):
+        return [
+            cache_path(cache_key(name, width, JPEG), JPEG)
+            for width in settings.POST_IMAGE_WIDTHS
+        ]
+
+    def maintain(self, *args):
+        call_command(
+            "maintain_media", "--workers=0", *args, stdout=io.StringIO()
+        )
+
+    def test_dry_run_changes_nothing(self):
+        stale = cache_path("0" * 40, JPEG)
+        os.makedirs(os.path.dirname(stale), exist_ok=True)
+        open(stale, "wb").close()
+        self.maintain("--dry-run")
+        self.assertTrue(self.storage.exists(self.orphan))
+        self.assertTrue(os.path.exists(stale))
+        for path in self.thumbnail_paths(self.name):
+            self.assertFalse(os.path.exists(path))
+
+    def test_thumbnails_created_and_orphans_removed(self):
+        """Недостающие копии создаются, сироты и чужие копии удаляются."""
+        stale = cache_path("0" * 40, JPEG)
+        os.makedirs(os.path.dirname(stale), exist_ok=True)
+        open(stale, "wb").close()
+        self.maintain()
+        for path in self.thumbnail_paths(self.name):
+            self.assertTrue(os.path.exists(path))
+        self.assertTrue(self.storage.exists(self.name))
+        self.assertFalse(self.storage.exists(self.orphan))
+        self.assertFalse(os.path.exists(stale))
+
+    def test_reuploaded_orphan_kept(self):
+        """Файл, на который появилась ссылка после поиска сирот, не
+        удаляется."""
+        StoredImage.objects.create(name=self.orphan, refs=1)
+        self.maintain()
+        self.assertTrue(self.storage.exists(self.orphan))
+        self.assertTrue(StoredImage.objects.filter(name=self.orphan).exists())
+
+    def test_resume_skips_finished_names(self):
+        state = os.path.join(settings.MEDIA_ROOT, "state.json")
+        Progress(state).done(0, self.name)
+        self.maintain("--resume", f"--state={state}")
+        for path in self.thumbnail_paths(self.name):
+            self.assertFalse(os.path.exists(path))
+        self.assertFalse(os.path.exists(state))
+
+    def test_progress_keeps_contiguous_prefix(self):
+        state = os.path.join(settings.MEDIA_ROOT, "state.json")
+        progress = Progress(state)
+        progress.done(1, "posts/b")
+        self.assertEqual(progress.load(), "")
+        progress.done(0, "posts/a")
+        self.assertEqual(progress.load(), "posts/b")
+        progress.clear()
@@ -0,0 +1,107 @@
+import unittest
+from unittest import mock
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+from django.urls import reverse
+
+from ..models import Post, User
+from ..search import (
+    decode_search_cursor,
+    encode_search_cursor,
+    search_posts,
+)
+from .base_testcase import BaseTestCase
+
+
+class SearchViewsTest(BaseTestCase):
+    def setUp(self):
+        self.search_url = reverse("posts:search")
+        self.matching = [
+            Post.objects.create(
+                author=self.user, text=f"Котики и собаки, запись {i}"
+            )
+            for i in range(settings.POST_ON_PAGE + 3)
+        ]
+        self.other = Post.objects.create(author=self.user, text="Про погоду")
+
+    def test_search_finds_matching_posts(self):
+        """Поиск возвращает только посты со всеми словами запроса."""
+        response = self.client.get(self.search_url, {"q": "котики собаки"})
+        found = [post.pk for post in response.context["page_obj"]]
+        self.assertEqual(len(found), settings.POST_ON_PAGE)
+        self.assertNotIn(self.other.pk, found)
+        self.assertTrue(response.context["page_obj"].has_next())
+
+    def test_search_pages_cover_results_without_gaps(self):
+        """Курсор «Далее» проходит все результаты без повторов."""
+        seen = []
+        params = {"q": "котик"}
+        while True:
+            page_obj = self.client.get(self.search_url, params).context[
+                "page_obj"
+            ]
+            seen.extend(post.pk for post in page_obj)
+            if not page_obj.has_next():
+                break
+            params["after"] = page_obj.older_cursor
+        self.assertCountEqual(seen, [post.pk for post in self.matching])
+        self.assertEqual(len(seen), len(set(seen)))
+
+    def test_results_ranked_by_relevance(self):
+        """Более релевантный пост идет первым."""
+        best = Post.objects.create(author=self.user, text="Погода погода")
+        response = self.client.get(self.search_url, {"q": "погода"})
+        self.assertEqual(response.context["page_obj"][0].pk, best.pk)
+
+    def test_index_follows_edit_and_delete(self):
+        """Правка и удаление поста сразу видны в поиске."""
+        self.other.text = "Про снег"
+        self.other.save()
+        self.assertFalse(search_posts(Post.objects.all(), "погоду").exists())
+        self.assertTrue(search_posts(Post.objects.all(), "снег").exists())
+
+        self.other.delete()
+        self.assertFalse(search_posts(Post.objects.all(), "снег").exists())
+
+    def test_query_without_words(self):
+        """Запрос из одних знаков препинания ничего не находит."""
+        response = self.client.get(self.search_url, {"q": '"*:('})
+        self.assertEqual(len(response.context["page_obj"]), 0)
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке идет по тому же индексу."""
+        admin = User.objects.create_superuser(
+            "admin", "admin@example.com", "password"
+        )
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse("admin:posts_post_changelist"), {"q": "погоду"}
+        )
+        self.assertEqual(
+            [post.pk for post in response.context["cl"].result_list],
+            [self.other.pk],
+        )
+
+    def test_postgres_rank_is_double_precision(self):
+        """rank на PostgreSQL приводится к double, как и курсор."""
+        with mock.patch("posts.search.is_postgres", return_value=True):
+            posts = search_posts(Post.objects.all(), "котики")
+        rank = posts.query.annotations["rank"]
+        self.assertIsInstance(rank, Cast)
+        self.assertIsInstance(rank.output_field, FloatField)
+
+    @unittest.skipUnless(
+        connection.vendor == "postgresql", "ts_rank есть только в PostgreSQL"
+    )
+    def test_postgres_cursor_matches_its_row(self):
+        """Ранг из курсора точно совпадает с рангом строки в БД."""
+        post = search_posts(Post.objects.all(), "котики").first()
+        cursor = decode_search_cursor(encode_search_cursor(post))
+        self.assertTrue(
+            search_posts(Post.objects.all(), "котики")
+            .filter(rank=cursor.rank, pk=cursor.pk)
+            .exists()
+        )
@@ -0,0 +1,97 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.utils import timezone
+
+from ..models import Post, Tag, TagBucket, TagPost
+from ..tags import extract_tags
+from ..trending import bucket_start, trending_tags
+from .base_testcase import BaseTestCase
+
+
+class HashtagTest(BaseTestCase):
+    def tag_names(self, post):
+        return set(post.tag.values_list("name", flat=True))
+
+    def test_extract_tags(self):
+        """Хештеги выделяются без повторов и в нижнем регистре."""
+        self.assertEqual(
+            extract_tags("#Котики и #собаки, снова #котики и #" + "x" * 40),
+            ["котики", "собаки"],
+        )
+
+    def test_tags_created_with_post(self):
+        """Хештеги нового поста становятся его тегами."""
+        post = Post.objects.create(author=self.user, text="#котики #собаки")
+        self.assertEqual(self.tag_names(post), {"котики", "собаки"})
+        self.assertEqual(Tag.objects.get(name="котики").posts_count, 1)
+
+    def test_post_edit_diffs_tags(self):
+        """Правка поста меняет только изменившиеся связи с тегами."""
+        post = Post.objects.create(author=self.user, text="#котики #собаки")
+        kept = TagPost.objects.get(post=post, tag__name="котики")
+
+        post.text = "#котики #птицы"
+        post.save()
+
+        self.assertEqual(self.tag_names(post), {"котики", "птицы"})
+        self.assertTrue(TagPost.objects.filter(pk=kept.pk).exists())
+        self.assertEqual(Tag.objects.get(name="собаки").posts_count, 0)
+        self.assertEqual(Tag.objects.get(name="птицы").posts_count, 1)
+
+    def test_existing_tags_reused(self):
+        Post.objects.create(author=self.user, text="#котики")
+        Post.objects.create(author=self.other_user, text="#котики")
+        self.assertEqual(Tag.objects.filter(name="котики").count(), 1)
+        self.assertEqual(Tag.objects.get(name="котики").posts_count, 2)
+
+    def test_backfill_tags_command(self):
+        """Команда backfill_tags заполняет теги постов без сигналов."""
+        Post.objects.bulk_create(
+            [Post(author=self.user, text=f"Пост {i} #архив") for i in range(5)]
+        )
+        call_command("backfill_tags", batch_size=2, stdout=StringIO())
+        tag = Tag.objects.get(name="архив")
+        self.assertEqual(tag.posts_count, 5)
+        self.assertEqual(TagPost.objects.filter(tag=tag).count(), 5)
+
+
+class TrendingTagsTest(BaseTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def names(self):
+        return [tag["tag__name"] for tag in trending_tags()]
+
+    def test_trending_ranks_recent_tags(self):
+        """Популярные теги упорядочены по числу новых постов."""
+        Post.objects.create(author=self.user, text="#котики #собаки")
+        Post.objects.create(author=self.user, text="#котики")
+        self.assertEqual(self.names(), ["котики", "собаки"])
+        self.assertEqual(TagBucket.objects.get(tag__name="котики").count, 2)
+
+    def test_old_buckets_leave_window(self):
+        """Интервалы старше окна не попадают в популярные теги."""
+        tag = Tag.objects.create(name="архив")
+        old = timezone.now() - timedelta(
+            seconds=settings.TRENDING_WINDOW_SECONDS * 2
+        )
+        TagBucket.objects.create(tag=tag, bucket=bucket_start(old), count=5)
+        self.assertEqual(self.names(), [])
+
+        Post.objects.create(author=self.user, text="#архив")
+        self.assertEqual(TagBucket.objects.filter(tag=tag).count(), 1)
+
+    def test_post_delete_decrements_bucket(self):
+        post = Post.objects.create(author=self.user, text="#котики")
+        post.delete()
+        self.assertEqual(TagBucket.objects.get(tag__name="котики").count, 0)
+        self.assertEqual(self.names(), [])
+
+    def test_trending_on_index(self):
+        Post.objects.create(author=self.user, text="#котики")
+        response = self.client.get(self.index_url)
+        self.assertContains(response, "Сейчас обсуждают")
@@ -0,0 +1,151 @@
+import hashlib
+import os
+import unittest
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from PIL import features
+
+from ..images import JPEG, WEBP, cache_key, cache_path, target_size
+from ..models import Post
+from .base_testcase import BaseTestCase
+
+
+class InlineExecutor:
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+class ThumbnailViewTest(BaseTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def thumb_url(self, path=None, width=settings.POST_IMAGE_WIDTH):
+        return reverse(
+            "posts:thumbnail",
+            kwargs={"width": width, "path": path or self.post.image.name},
+        )
+
+    def test_thumbnail_served_from_disk_cache(self):
+        """Копия создается при первом запросе и кешируется на диске."""
+        response = self.client.get(self.thumb_url(), HTTP_ACCEPT="image/*")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertIn("Accept", response["Vary"])
+
+        key = cache_key(self.post.image.name, settings.POST_IMAGE_WIDTH, JPEG)
+        self.assertEqual(response["ETag"], f'"{key}"')
+        self.assertTrue(os.path.exists(cache_path(key, JPEG)))
+        self.assertIn(f"/{key[:2]}/{key[2:4]}/", cache_path(key, JPEG))
+
+    def test_etag_revalidation(self):
+        response = self.client.get(self.thumb_url())
+        response = self.client.get(
+            self.thumb_url(), HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        self.assertEqual(response.status_code, 304)
+
+    @unittest.skipUnless(features.check("webp"), "Pillow без WebP")
+    def test_webp_negotiated_from_accept(self):
+        response = self.client.get(
+            self.thumb_url(), HTTP_ACCEPT="image/webp,image/*"
+        )
+        self.assertEqual(response["Content-Type"], "image/webp")
+        key = cache_key(self.post.image.name, settings.POST_IMAGE_WIDTH, WEBP)
+        self.assertEqual(response["ETag"], f'"{key}"')
+
+    def test_rejected_requests(self):
+        """Чужие пути, неизвестные ширины и файлы отдают 404."""
+        urls = [
+            self.thumb_url(width=123),
+            self.thumb_url(path="../manage.py"),
+            self.thumb_url(path="posts/../../manage.py"),
+            self.thumb_url(path="posts/missing.gif"),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_feed_emits_plain_urls(self):
+        """Лента выводит адреса копий с srcset, не трогая картинку."""
+        response = self.client.get(self.index_url)
+        self.assertContains(response, self.thumb_url())
+        for width in settings.POST_IMAGE_WIDTHS:
+            self.assertContains(response, f"{self.thumb_url(width=width)} ")
+
+    def test_upload_queues_thumbnail_generation(self):
+        """Загрузка картинки через форму заранее создает все копии."""
+        image = SimpleUploadedFile(
+            name="queued.gif", content=self.small_gif, content_type="image/gif"
+        )
+        with mock.patch(
+            "posts.thumbnails.transaction.on_commit", lambda fn: fn()
+        ), mock.patch(
+            "posts.thumbnails.get_executor", return_value=InlineExecutor()
+        ):
+            self.authorized_client.post(
+                self.post_create_url, {"text": "С картинкой", "image": image}
+            )
+        name = Post.objects.get(text="С картинкой").image.name
+        for width in settings.POST_IMAGE_WIDTHS:
+            with self.subTest(width=width):
+                key = cache_key(name, width, JPEG)
+                self.assertTrue(os.path.exists(cache_path(key, JPEG)))
+
+
+class ImageMetadataTest(BaseTestCase):
+    def setUp(self):
+        self.content = self.make_image("navy", fmt="GIF")
+
+    def upload(self, name="meta.gif"):
+        image = SimpleUploadedFile(
+            name=name, content=self.content, content_type="image/gif"
+        )
+        self.authorized_client.post(
+            self.post_create_url, {"text": "С картинкой", "image": image}
+        )
+        return Post.objects.get(text="С картинкой")
+
+    def test_upload_stores_metadata(self):
+        """Форма сохраняет размеры, объем, формат, хеш и заглушку."""
+        post = self.upload()
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertEqual(post.image_size, len(self.content))
+        self.assertEqual(post.image_format, "gif")
+        self.assertEqual(
+            post.image_hash, hashlib.sha256(self.content).hexdigest()
+        )
+        self.assertTrue(
+            post.image_placeholder.startswith("data:image/png;base64,")
+        )
+
+    def test_feed_renders_without_opening_image(self):
+        """Карточка берет размеры и заглушку из полей, а не из файла."""
+        post = self.upload()
+        with mock.patch.object(
+            default_storage, "open", side_effect=AssertionError
+        ):
+            response = self.client.get(self.index_url)
+        width, height = target_size(settings.POST_IMAGE_WIDTH)
+        self.assertContains(response, f'width="{width}" height="{height}"')
+        self.assertContains(response, 'loading="lazy"')
+        self.assertContains(response, post.image_placeholder)
+        # оригинал 2x1, поэтому в srcset только самая узкая копия
+        smallest = settings.POST_IMAGE_WIDTHS[0]
+        self.assertContains(response, f"/{smallest}/{post.image.name}")
+        for width in settings.POST_IMAGE_WIDTHS[1:]:
+            self.assertNotContains(response, f"/{width}/{post.image.name}")
+
+    def test_edit_without_image_keeps_metadata(self):
+        post = self.upload()
+        self.authorized_client.post(
+            reverse("posts:post_edit", kwargs={"post_id": post.pk}),
+            {"text": "С картинкой"},
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.image_format, "gif")
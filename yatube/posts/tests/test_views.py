@@ -1,12 +1,25 @@
+from unittest import mock
+
 from django import forms
 from django.conf import settings
 from django.core.cache import cache
-from django.test import TestCase
+from django.db import OperationalError
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
-from ..apps import PostsConfig
+from ..caching import CARD_TEMPLATES, card_key
 
-from ..models import Follow, Group, Post, User
+from ..models import (
+    Comment,
+    FeedEntry,
+    Follow,
+    Group,
+    Post,
+    Tag,
+    TagPost,
+    User,
+)
 from .base_testcase import BaseTestCase
+from .test_thumbnails import InlineExecutor
 
 
 class PostViewsTest(BaseTestCase):
@@ -15,9 +28,7 @@ class PostViewsTest(BaseTestCase):
         self.assertEqual(first_page.text, self.post.text)
         self.assertEqual(first_page.author, self.user)
         self.assertEqual(first_page.group.slug, self.group.slug)
-        self.assertEqual(
-            first_page.image, f"{PostsConfig.name}/{self.uploaded.name}"
-        )
+        self.assertEqual(first_page.image, self.image_name)
 
     def test_pages_used_correct_template(self):
         """URL-адрес использует соответствующий шаблон."""
@@ -53,7 +64,7 @@ class PostViewsTest(BaseTestCase):
         response = self.authorized_client.get(self.post_detail_url)
         self.assertEqual(response.context.get("post").text, "Тестовый пост")
         self.assertEqual(response.context.get("post").author, self.user)
-        self.assertEqual(response.context.get("post").image, "posts/small.gif")
+        self.assertEqual(response.context.get("post").image, self.image_name)
         self.assertEqual(
             response.context.get("comments")[0].text, self.comment.text
         )
@@ -100,6 +111,151 @@ class PostViewsTest(BaseTestCase):
         self.assertNotEqual(response, response_clear)
 
 
+class FeedCacheViewsTest(BaseTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_cached_feed_pages_differ(self):
+        """Кеш фрагмента ленты учитывает номер страницы."""
+        for i in range(settings.POST_ON_PAGE):
+            Post.objects.create(
+                author=self.user, text=f"Пост {i}", group=self.group
+            )
+        for url in (self.index_url, self.group_url, self.profile_url):
+            with self.subTest(url=url):
+                first = self.client.get(url).content.decode()
+                second = self.client.get(url, {"page": 2}).content.decode()
+                self.assertNotIn(self.post.text + "<", first)
+                self.assertIn(self.post.text + "<", second)
+
+    def test_new_post_invalidates_cached_feeds(self):
+        """Новый пост сразу виден в закешированных лентах."""
+        Follow.objects.create(user=self.other_user, author=self.user)
+        urls = {
+            self.index_url: self.client,
+            self.group_url: self.client,
+            self.profile_url: self.client,
+            self.follow_index_url: self.auth_other_user,
+        }
+        for url, client in urls.items():
+            client.get(url)
+
+        Post.objects.create(
+            author=self.user, text="Свежий пост", group=self.group
+        )
+        for url, client in urls.items():
+            with self.subTest(url=url):
+                self.assertContains(client.get(url), "Свежий пост")
+
+    def test_group_change_invalidates_old_group(self):
+        """Перенос поста в другую группу сбрасывает кеш старой группы."""
+        self.client.get(self.group_url)
+        self.post.group = self.group2
+        self.post.save()
+
+        response = self.client.get(self.group_url)
+        self.assertNotContains(response, self.post.text)
+
+    def test_post_cards_cached(self):
+        """Карточки постов ленты кешируются по отдельности."""
+        post = Post.objects.get(pk=self.post.pk)
+        self.client.get(self.index_url)
+        self.client.get(self.profile_url)
+        for template_name in CARD_TEMPLATES:
+            with self.subTest(template_name=template_name):
+                self.assertIsNotNone(cache.get(card_key(post, template_name)))
+
+    def test_post_edit_refreshes_card(self):
+        """Правка поста заменяет его карточку во всех лентах."""
+        old_key = card_key(Post.objects.get(pk=self.post.pk))
+        self.client.get(self.index_url)
+        self.authorized_client.post(
+            self.post_edit_url, {"text": "Новый текст", "group": self.group.pk}
+        )
+
+        self.assertIsNone(cache.get(old_key))
+        for url in (self.index_url, self.group_url, self.profile_url):
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), "Новый текст")
+
+
+    def test_author_rename_refreshes_cards(self):
+        """Новое имя автора сразу видно в закешированных лентах."""
+        self.client.get(self.index_url)
+        author = User.objects.get(pk=self.user.pk)
+        author.first_name = "Лев"
+        author.last_name = "Толстой"
+        author.save()
+        self.assertContains(self.client.get(self.index_url), "Лев Толстой")
+
+    def test_group_slug_change_refreshes_cards(self):
+        """Ссылки карточек ведут на группу по новому адресу."""
+        self.client.get(self.index_url)
+        group = Group.objects.get(pk=self.group.pk)
+        group.slug = "new-slug"
+        group.save()
+        self.assertContains(
+            self.client.get(self.index_url),
+            reverse("posts:group_list", kwargs={"slug": "new-slug"}),
+        )
+
+
+class StaleFeedViewsTest(BaseTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_feeds_served_stale_when_database_fails(self):
+        """Анонимные ленты при сбое БД отдаются из последней копии."""
+        for url in (self.index_url, self.group_url, self.profile_url):
+            with self.subTest(url=url):
+                fresh = self.client.get(url)
+                with mock.patch(
+                    "posts.views.get_page_obj",
+                    side_effect=OperationalError,
+                ):
+                    stale = self.client.get(url)
+                self.assertEqual(stale.content, fresh.content)
+                self.assertIn("Warning", stale)
+
+
+class QueryBudgetViewsTest(BaseTestCase):
+    def setUp(self):
+        cache.clear()
+        tag = Tag.objects.create(name="тег")
+        Follow.objects.create(user=self.other_user, author=self.user)
+        for i in range(settings.POST_ON_PAGE * 2):
+            post = Post.objects.create(
+                author=self.user if i % 2 else self.other_user,
+                text=f"Пост {i}",
+                group=self.group,
+            )
+            TagPost.objects.create(tag=tag, post=post)
+            Comment.objects.create(
+                post=self.post, author=self.other_user, text=f"Текст {i}"
+            )
+
+    def test_views_stay_within_query_budget(self):
+        """Страницы укладываются в бюджет запросов без кеша."""
+        urls = {
+            self.index_url: self.client,
+            self.group_url: self.client,
+            reverse("posts:tag_list", kwargs={"name": "тег"}): self.client,
+            self.profile_url: self.auth_other_user,
+            self.post_detail_url: self.authorized_client,
+            self.follow_index_url: self.auth_other_user,
+            self.post_create_url: self.authorized_client,
+            self.post_edit_url: self.authorized_client,
+            reverse(
+                "posts:post_comments", kwargs={"post_id": self.post.pk}
+            ): self.client,
+            reverse("posts:search") + "?q=Пост": self.client,
+        }
+        for url, client in urls.items():
+            with self.subTest(url=url):
+                cache.clear()
+                self.assertWithinQueryBudget(client, url)
+
+
 class PaginatorViewsTest(BaseTestCase):
     def test_paginator_views(self):
         Post.objects.bulk_create(
@@ -122,6 +278,10 @@ class PaginatorViewsTest(BaseTestCase):
             (self.index_url + second_page, records_on_second_page),
             (self.group_url, settings.POST_ON_PAGE),
             (self.group_url + second_page, records_on_second_page),
+            # счетчик постов автора не знает о bulk_create, а страницы
+            # профиля не должны от него зависеть
+            (self.profile_url, settings.POST_ON_PAGE),
+            (self.profile_url + second_page, records_on_second_page),
         ]
 
         for (page, count_pages) in template_paginator:
@@ -132,6 +292,183 @@ class PaginatorViewsTest(BaseTestCase):
                 )
 
 
+class CursorPaginatorViewsTest(BaseTestCase):
+    def setUp(self):
+        Post.objects.bulk_create(
+            [
+                Post(
+                    author=self.user,
+                    text=f"Тестовый пост {i}",
+                    group=self.group,
+                )
+                for i in range(settings.POST_ON_PAGE * 2 + 3)
+            ]
+        )
+
+    def walk(self, url, cursor_attr):
+        seen = []
+        response = self.client.get(url, {"cursor": ""})
+        while True:
+            page_obj = response.context["page_obj"]
+            seen.extend(post.pk for post in page_obj)
+            cursor = getattr(page_obj, cursor_attr)
+            if cursor is None:
+                return response, seen
+            response = self.client.get(url, {"cursor": cursor})
+
+    def test_cursor_pages_cover_feed_without_gaps(self):
+        """Переход по курсору «старее» проходит всю ленту без повторов."""
+        for url, posts in (
+            (self.index_url, Post.objects.all()),
+            (self.group_url, self.group.posts.all()),
+            (self.profile_url, self.user.posts.all()),
+        ):
+            with self.subTest(url=url):
+                _, seen = self.walk(url, "older_cursor")
+                expected = list(
+                    posts.order_by("-pub_date", "-pk").values_list(
+                        "pk", flat=True
+                    )
+                )
+                self.assertEqual(seen, expected)
+
+    def test_cursor_newer_returns_previous_page(self):
+        """Курсор «новее» возвращает предыдущую страницу целиком."""
+        first = self.client.get(self.index_url, {"cursor": ""})
+        second = self.client.get(
+            self.index_url,
+            {"cursor": first.context["page_obj"].older_cursor},
+        )
+        back = self.client.get(
+            self.index_url,
+            {"cursor": second.context["page_obj"].newer_cursor},
+        )
+        self.assertEqual(
+            [post.pk for post in back.context["page_obj"]],
+            [post.pk for post in first.context["page_obj"]],
+        )
+        self.assertFalse(back.context["page_obj"].has_previous())
+
+    def test_invalid_cursor_returns_first_page(self):
+        """Поврежденный курсор открывает первую страницу."""
+        response = self.client.get(self.index_url, {"cursor": "bad!"})
+        page_obj = response.context["page_obj"]
+        self.assertEqual(len(page_obj), settings.POST_ON_PAGE)
+        self.assertFalse(page_obj.has_previous())
+        self.assertTrue(page_obj.has_next())
+
+
+class TagViewsTest(BaseTestCase):
+    def setUp(self):
+        cache.clear()
+        self.tagged = [
+            Post.objects.create(author=self.user, text=f"Пост {i} #котики")
+            for i in range(settings.POST_ON_PAGE + 1)
+        ]
+        self.tag = Tag.objects.get(name="котики")
+        self.untagged = Post.objects.create(author=self.user, text="Без тега")
+        self.tag_url = reverse("posts:tag_list", kwargs={"name": "котики"})
+
+    def test_tag_page_lists_tagged_posts(self):
+        """Страница тега выводит только его посты в порядке ленты."""
+        pages = [
+            self.client.get(self.tag_url).context["page_obj"],
+            self.client.get(self.tag_url, {"page": 2}).context["page_obj"],
+        ]
+        self.assertEqual(pages[0].paginator.count, len(self.tagged))
+        self.assertEqual(
+            [post.pk for page_obj in pages for post in page_obj],
+            [post.pk for post in reversed(self.tagged)],
+        )
+
+    def test_drifted_counter_keeps_pages(self):
+        """Страницы тега не зависят от денормализованного счетчика."""
+        Tag.objects.filter(pk=self.tag.pk).update(posts_count=1)
+        response = self.client.get(self.tag_url, {"page": 2})
+        self.assertEqual(
+            [post.pk for post in response.context["page_obj"]],
+            [self.tagged[0].pk],
+        )
+
+    def test_tag_post_copies_pub_date(self):
+        post = self.tagged[0]
+        tag_post = TagPost.objects.get(tag=self.tag, post=post)
+        self.assertEqual(tag_post.pub_date, post.pub_date)
+
+    def test_unknown_tag(self):
+        response = self.client.get(
+            reverse("posts:tag_list", kwargs={"name": "нет"})
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_tag_cloud_follows_new_tags(self):
+        """Облако тегов на главной обновляется при появлении тега."""
+        self.assertContains(self.client.get(self.index_url), "#котики")
+        Post.objects.create(author=self.user, text="#собаки")
+        self.assertContains(self.client.get(self.index_url), "#собаки")
+
+    def test_post_edit_refreshes_tag_page(self):
+        """Правка поста видна на закешированной странице тега."""
+        self.client.get(self.tag_url)
+        post = Post.objects.get(pk=self.tagged[-1].pk)
+        post.text = "Новый текст #котики"
+        post.save()
+        self.assertContains(self.client.get(self.tag_url), "Новый текст")
+
+
+class CommentPaginationViewsTest(BaseTestCase):
+    def setUp(self):
+        Comment.objects.bulk_create(
+            [
+                Comment(
+                    post=self.post, author=self.other_user, text=f"Текст {i}"
+                )
+                for i in range(settings.COMMENTS_ON_PAGE * 2 + 3)
+            ]
+        )
+        self.comments_url = reverse(
+            "posts:post_comments", kwargs={"post_id": self.post.pk}
+        )
+
+    def test_post_detail_shows_first_batch(self):
+        """post_detail выводит только первую пачку комментариев."""
+        response = self.client.get(self.post_detail_url)
+        self.assertEqual(
+            len(response.context["comments"]), settings.COMMENTS_ON_PAGE
+        )
+        self.assertContains(response, self.comments_url + "?after=")
+
+    def test_load_more_covers_comments_without_gaps(self):
+        """Фрагменты «Показать еще» проходят все комментарии по порядку."""
+        response = self.client.get(self.post_detail_url)
+        seen = [comment.pk for comment in response.context["comments"]]
+        cursor = response.context["comments_cursor"]
+        while cursor is not None:
+            response = self.client.get(self.comments_url, {"after": cursor})
+            self.assertTemplateUsed(response, "includes/comment_list.html")
+            seen.extend(comment.pk for comment in response.context["comments"])
+            cursor = response.context["comments_cursor"]
+        expected = list(
+            self.post.comments.order_by("created", "pk").values_list(
+                "pk", flat=True
+            )
+        )
+        self.assertEqual(seen, expected)
+        self.assertNotContains(response, "?after=")
+
+    def test_invalid_comment_cursor_returns_first_batch(self):
+        """Поврежденный курсор возвращает первую пачку комментариев."""
+        response = self.client.get(self.comments_url, {"after": "bad!"})
+        self.assertEqual(response.context["comments"][0].pk, self.comment.pk)
+
+    def test_comments_of_missing_post(self):
+        """Фрагмент комментариев несуществующего поста отдает 404."""
+        response = self.client.get(
+            reverse("posts:post_comments", kwargs={"post_id": 0})
+        )
+        self.assertEqual(response.status_code, 404)
+
+
 class FollowViewsTest(BaseTestCase):
     def test_auth_user_can_follow_authors(self):
         """Тестирование подписки и отписки авторизованного пользователя"""
@@ -159,3 +496,93 @@ class FollowViewsTest(BaseTestCase):
 
     def test_show_posts_to_not_followers(self):
         self.assertFollow()
+
+    def test_new_post_delivered_to_follower_feed(self):
+        """Новый пост автора попадает в ленту подписчика."""
+        self.auth_other_user.get(self.profile_follow_url)
+        post = Post.objects.create(author=self.user, text="Свежий пост")
+
+        response = self.auth_other_user.get(self.follow_index_url)
+        self.assertEqual(response.context["page_obj"][0], post)
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.other_user, post=post).exists()
+        )
+
+    def test_unfollow_prunes_feed(self):
+        """Отписка удаляет посты автора из ленты читателя."""
+        self.auth_other_user.get(self.profile_follow_url)
+        self.assertTrue(FeedEntry.objects.filter(user=self.other_user))
+
+        self.auth_other_user.get(self.profile_unfollow_url)
+        response = self.auth_other_user.get(self.follow_index_url)
+        self.assertEqual(len(response.context["page_obj"]), 0)
+        self.assertFalse(FeedEntry.objects.filter(user=self.other_user))
+
+    @override_settings(FEED_FANOUT_BATCH_SIZE=1)
+    def test_background_delivery_refreshes_cached_feed(self):
+        """Лента, закешированная до фоновой доставки поста, обновляется."""
+        cache.clear()
+        third_user = User.objects.create_user(username="third_user")
+        third_client = Client()
+        third_client.force_login(third_user)
+        Follow.objects.create(user=self.other_user, author=self.user)
+        Follow.objects.create(user=third_user, author=self.user)
+        callbacks = []
+        with mock.patch(
+            "posts.feed.transaction.on_commit", callbacks.append
+        ), mock.patch(
+            "posts.feed.get_executor", return_value=InlineExecutor()
+        ):
+            post = Post.objects.create(author=self.user, text="Поздний пост")
+            response = third_client.get(self.follow_index_url)
+            self.assertNotContains(response, post.text)
+            for callback in callbacks:
+                callback()
+        response = third_client.get(self.follow_index_url)
+        self.assertContains(response, post.text)
+
+    @override_settings(FOLLOW_FEED_MODE="hybrid", FEED_FANOUT_FOLLOWER_LIMIT=1)
+    def test_author_below_limit_keeps_pulled_posts(self):
+        """Посты, не разложенные у популярного автора, не пропадают из
+        ленты, когда подписчиков становится не больше порога."""
+        cache.clear()
+        third_user = User.objects.create_user(username="third_user")
+        Follow.objects.create(user=self.other_user, author=self.user)
+        Follow.objects.create(user=third_user, author=self.user)
+        post = Post.objects.create(author=self.user, text="Пост для многих")
+        self.assertFalse(FeedEntry.objects.filter(post=post).exists())
+
+        callbacks = []
+        with mock.patch(
+            "posts.feed.transaction.on_commit", callbacks.append
+        ), mock.patch(
+            "posts.feed.get_executor", return_value=InlineExecutor()
+        ):
+            Follow.objects.filter(user=third_user).delete()
+            # страница, отрисованная до фоновой раскладки, не должна
+            # остаться в кеше
+            self.auth_other_user.get(self.follow_index_url)
+            for callback in callbacks:
+                callback()
+        response = self.auth_other_user.get(self.follow_index_url)
+        self.assertEqual(
+            [item.pk for item in response.context["page_obj"]],
+            [post.pk, self.post.pk],
+        )
+        self.assertContains(response, post.text)
+
+    @override_settings(FOLLOW_FEED_MODE="hybrid", FEED_FANOUT_FOLLOWER_LIMIT=0)
+    def test_hybrid_feed_merges_popular_authors(self):
+        """Посты популярных авторов подмешиваются в ленту при чтении."""
+        cache.clear()
+        third_user = User.objects.create_user(username="third_user")
+        Follow.objects.create(user=self.other_user, author=third_user)
+        Follow.objects.create(user=self.other_user, author=self.user)
+        post = Post.objects.create(author=third_user, text="Новый пост")
+
+        self.assertFalse(FeedEntry.objects.filter(post=post).exists())
+        response = self.auth_other_user.get(self.follow_index_url)
+        self.assertEqual(
+            [item.pk for item in response.context["page_obj"]],
+            [post.pk, self.post.pk],
+        )
@@ -0,0 +1,102 @@
+import io
+import os
+import shutil
+import tempfile
+
+from core.degradation import copy_key
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import (
+    RequestFactory,
+    TransactionTestCase,
+    override_settings,
+)
+from django.urls import reverse
+
+from .. import images
+from ..images import JPEG, cache_key, cache_path
+from ..models import Follow, Group, Post, User
+from .base_testcase import BaseTestCase
+
+
+class WarmCacheMixin:
+    def warm(self, *args):
+        out = io.StringIO()
+        call_command("warm_cache", *args, stdout=out)
+        return out.getvalue()
+
+    def last_good(self, url):
+        request = RequestFactory().get(url)
+        return cache.get(copy_key(request))
+
+    def assertWarmed(self, urls, name):
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertIsNotNone(self.last_good(url))
+        for width in settings.POST_IMAGE_WIDTHS:
+            path = cache_path(cache_key(name, width, JPEG), JPEG)
+            self.assertTrue(os.path.exists(path))
+
+
+class WarmCacheTest(WarmCacheMixin, BaseTestCase):
+    def setUp(self):
+        cache.clear()
+        self.name = self.post.image.name
+        images.drop_thumbnails(self.name)
+        Follow.objects.create(user=self.other_user, author=self.user)
+        self.urls = [self.index_url, self.group_url, self.profile_url]
+
+    def test_pages_and_thumbnails_warmed(self):
+        """Главная, активная группа и читаемый профиль попадают в кеш."""
+        self.warm("--concurrency=0")
+        self.assertWarmed(self.urls, self.name)
+
+    def test_budget_stops_new_tasks(self):
+        output = self.warm("--concurrency=0", "--budget=0")
+        self.assertIn("Прогрето: 0, ошибок: 0", output)
+        for url in self.urls:
+            self.assertIsNone(self.last_good(url))
+
+
+class PooledWarmCacheTest(WarmCacheMixin, TransactionTestCase):
+    """Прогрев в пуле потоков: у каждого потока свое соединение с БД,
+    поэтому данные должны быть закоммичены."""
+
+    @classmethod
+    def setUpClass(cls):
+        # свой каталог: TEMP_MEDIA_ROOT удаляют классы BaseTestCase
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_settings = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_settings.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create_user(username="author")
+        reader = User.objects.create_user(username="reader")
+        group = Group.objects.create(title="Группа", slug="pooled")
+        post = Post.objects.create(author=author, text="Пост", group=group)
+        post.image.save(
+            "pooled.png", ContentFile(BaseTestCase.make_image("teal"))
+        )
+        Follow.objects.create(user=reader, author=author)
+        self.name = post.image.name
+        images.drop_thumbnails(self.name)
+        self.urls = [
+            reverse("posts:index"),
+            reverse("posts:group_list", args=[group.slug]),
+            reverse("posts:profile", args=[author.username]),
+        ]
+
+    def test_pages_and_thumbnails_warmed_in_threads(self):
+        output = self.warm("--concurrency=4")
+        self.assertIn("ошибок: 0", output)
+        self.assertWarmed(self.urls, self.name)
@@ -0,0 +1,84 @@
+"""Заблаговременная подготовка уменьшенных копий картинок постов.
+
+Загрузка картинки (сигнал Post) ставит в очередь генерацию копий всех
+ширин POST_IMAGE_WIDTHS во всех доступных форматах, а выполняет ее пул
+процессов после коммита. Так первый запрос /media/thumb/ к свежей
+картинке обычно уже попадает в дисковый кеш posts.images.
+"""
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+
+from . import images
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        # spawn вместо fork: рабочий процесс открывает свои соединения с БД,
+        # а не делит сокеты с родителем
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.POST_THUMBNAIL_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=django.setup,
+        )
+    return _executor
+
+
+def queued_key(name):
+    return f"thumbnail_queued:{name}"
+
+
+def source_exists(name):
+    try:
+        return default_storage.exists(name)
+    except (OSError, SuspiciousFileOperation):
+        return False
+
+
+def schedule(name):
+    """Ставит генерацию копий картинки в очередь после коммита."""
+    if not name or not source_exists(name):
+        return
+    if cache.add(
+        queued_key(name), True, settings.POST_THUMBNAIL_QUEUE_TIMEOUT
+    ):
+        transaction.on_commit(partial(submit, name))
+
+
+def submit(name):
+    global _executor
+    try:
+        get_executor().submit(generate_in_worker, name)
+    except BrokenProcessPool:
+        _executor = None
+        get_executor().submit(generate_in_worker, name)
+
+
+def generate(name):
+    """Создает копии картинки всех ширин и форматов."""
+    for width in settings.POST_IMAGE_WIDTHS:
+        for fmt in images.available_formats():
+            images.get_thumbnail(name, width, fmt)
+
+
+def generate_in_worker(name):
+    try:
+        generate(name)
+    except Exception:
+        logger.exception("Thumbnail generation for %s failed", name)
+    finally:
+        connections.close_all()
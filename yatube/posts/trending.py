@@ -0,0 +1,72 @@
+"""Популярные теги за скользящее окно.
+
+Каждая новая связь поста с тегом увеличивает счетчик TagBucket за
+интервал TRENDING_BUCKET_SECONDS, к которому относится дата поста. Топ
+тегов за TRENDING_WINDOW_SECONDS складывается из нескольких интервалов, а
+не из GROUP BY по TagPost, и кешируется до начала следующего интервала.
+"""
+from collections import Counter
+from datetime import datetime, timedelta
+
+from core.stampede import get_or_compute
+from django.conf import settings
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import TagBucket
+
+
+def bucket_start(moment):
+    size = settings.TRENDING_BUCKET_SECONDS
+    stamp = int(moment.timestamp()) // size * size
+    return datetime.fromtimestamp(stamp, tz=timezone.utc)
+
+
+def window_start(now=None):
+    now = now or timezone.now()
+    window = timedelta(seconds=settings.TRENDING_WINDOW_SECONDS)
+    return bucket_start(now - window)
+
+
+def count_tags(links, delta):
+    """Учитывает пары (tag_id, pub_date) в счетчиках интервалов."""
+    start = window_start()
+    buckets = Counter(
+        (tag_id, bucket_start(pub_date))
+        for tag_id, pub_date in links
+        if pub_date >= start
+    )
+    for (tag_id, bucket), count in buckets.items():
+        rows = TagBucket.objects.filter(tag_id=tag_id, bucket=bucket)
+        if rows.update(count=F("count") + count * delta) or delta < 0:
+            continue
+        _, created = TagBucket.objects.get_or_create(
+            tag_id=tag_id, bucket=bucket
+        )
+        rows.update(count=F("count") + count)
+        if created:
+            # новый интервал тега появляется раз в TRENDING_BUCKET_SECONDS,
+            # тогда же убираем его интервалы, выпавшие из окна
+            TagBucket.objects.filter(
+                tag_id=tag_id, bucket__lt=start
+            ).delete()
+
+
+def trending_key(start):
+    return f"trending_tags:{int(start.timestamp())}"
+
+
+def trending_tags():
+    """До TRENDING_TOP тегов с наибольшим числом постов в окне."""
+    start = window_start()
+    return get_or_compute(
+        trending_key(start),
+        lambda: list(
+            TagBucket.objects.filter(bucket__gte=start)
+            .values("tag__name")
+            .annotate(total=Sum("count"))
+            .filter(total__gt=0)
+            .order_by("-total", "tag__name")[: settings.TRENDING_TOP]
+        ),
+        settings.TRENDING_CACHE_TIMEOUT,
+    )
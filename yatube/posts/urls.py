@@ -7,6 +7,7 @@ app_name = "posts"
 urlpatterns = [
     path("", views.index, name="index"),
     path("group/<slug:slug>/", views.group_posts, name="group_list"),
+    path("tag/<str:name>/", views.tag_posts, name="tag_list"),
     path("profile/<str:username>/", views.profile, name="profile"),
     path("posts/<int:post_id>/edit/", views.post_edit, name="post_edit"),
     path("posts/<int:post_id>/", views.post_detail, name="post_detail"),
@@ -14,7 +15,18 @@ urlpatterns = [
     path(
         "posts/<int:post_id>/comment/", views.add_comment, name="add_comment"
     ),
+    path(
+        "posts/<int:post_id>/comments/",
+        views.post_comments,
+        name="post_comments",
+    ),
     path("follow/", views.follow_index, name="follow_index"),
+    path("search/", views.search, name="search"),
+    path(
+        "media/thumb/<int:width>/<path:path>",
+        views.thumbnail,
+        name="thumbnail",
+    ),
     path(
         "profile/<str:username>/follow",
         views.profile_follow,
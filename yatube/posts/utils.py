@@ -1,10 +1,184 @@
-from typing import Any
+import base64
+import binascii
+from typing import Any, NamedTuple, Optional
 
 from django.conf import settings
 from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+NEWER = "n"
+OLDER = "o"
+
+
+class Cursor(NamedTuple):
+    direction: str
+    pub_date: Any
+    pk: int
+
+
+class CursorPage:
+    """Страница ленты, выбранная по ключу (pub_date, id).
+
+    В отличие от Paginator не выполняет COUNT(*) и OFFSET: каждая страница
+    читается одним запросом по индексу независимо от глубины.
+    """
+
+    is_cursor = True
+
+    def __init__(self, object_list, newer_cursor=None, older_cursor=None):
+        self.object_list = object_list
+        self.newer_cursor = newer_cursor
+        self.older_cursor = older_cursor
+
+    def __repr__(self):
+        return f"<CursorPage of {len(self)} items>"
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self.older_cursor is not None
+
+    def has_previous(self):
+        return self.newer_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_previous() or self.has_next()
+
+
+def pack_cursor(*parts) -> str:
+    raw = "|".join(str(part) for part in parts)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def unpack_cursor(value: str):
+    raw = base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+    return raw.decode().split("|")
+
+
+def encode_cursor(obj, direction: str) -> str:
+    return pack_cursor(direction, obj.pub_date.isoformat(), obj.pk)
+
+
+def decode_cursor(value: Optional[str]) -> Optional[Cursor]:
+    if not value:
+        return None
+    try:
+        direction, pub_date, pk = unpack_cursor(value)
+        cursor = Cursor(direction, parse_datetime(pub_date), int(pk))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if cursor.direction not in (NEWER, OLDER) or cursor.pub_date is None:
+        return None
+    return cursor
+
+
+def seek(object_list: Any, cursor: Optional[Cursor], limit: int):
+    """Возвращает до limit объектов за курсором в порядке ленты."""
+    if hasattr(object_list, "seek"):
+        return object_list.seek(cursor, limit)
+    if cursor is None:
+        return list(object_list.order_by("-pub_date", "-pk")[:limit])
+    if cursor.direction == NEWER:
+        newer = Q(pub_date__gt=cursor.pub_date) | Q(
+            pub_date=cursor.pub_date, pk__gt=cursor.pk
+        )
+        rows = object_list.filter(newer).order_by("pub_date", "pk")[:limit]
+        return list(rows)[::-1]
+    older = Q(pub_date__lt=cursor.pub_date) | Q(
+        pub_date=cursor.pub_date, pk__lt=cursor.pk
+    )
+    return list(
+        object_list.filter(older).order_by("-pub_date", "-pk")[:limit]
+    )
+
+
+def get_cursor_page(request, object_list: Any):
+    cursor = decode_cursor(request.GET.get("cursor"))
+    return build_cursor_page(object_list, cursor, settings.POST_ON_PAGE)
+
+
+def build_cursor_page(object_list: Any, cursor: Optional[Cursor], per_page):
+    rows = seek(object_list, cursor, per_page + 1)
+    if cursor is not None and cursor.direction == NEWER:
+        if not rows:
+            return build_cursor_page(object_list, None, per_page)
+        has_newer = len(rows) > per_page
+        rows = rows[-per_page:]
+        return CursorPage(
+            rows,
+            newer_cursor=encode_cursor(rows[0], NEWER) if has_newer else None,
+            older_cursor=encode_cursor(rows[-1], OLDER),
+        )
+
+    has_older = len(rows) > per_page
+    rows = rows[:per_page]
+    return CursorPage(
+        rows,
+        newer_cursor=(
+            encode_cursor(rows[0], NEWER) if cursor and rows else None
+        ),
+        older_cursor=encode_cursor(rows[-1], OLDER) if has_older else None,
+    )
+
+
+class CommentCursor(NamedTuple):
+    created: Any
+    pk: int
+
+
+def encode_comment_cursor(comment) -> str:
+    return pack_cursor(comment.created.isoformat(), comment.pk)
+
+
+def decode_comment_cursor(value: Optional[str]) -> Optional[CommentCursor]:
+    if not value:
+        return None
+    try:
+        created, pk = unpack_cursor(value)
+        cursor = CommentCursor(parse_datetime(created), int(pk))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if cursor.created is None:
+        return None
+    return cursor
+
+
+def get_comment_batch(comments, cursor: Optional[CommentCursor]):
+    """Очередная пачка комментариев после курсора по (created, id).
+
+    Возвращает комментарии и курсор следующей пачки или None, если
+    комментарии закончились.
+    """
+    comments = comments.select_related("author").order_by("created", "pk")
+    if cursor is not None:
+        comments = comments.filter(
+            Q(created__gt=cursor.created)
+            | Q(created=cursor.created, pk__gt=cursor.pk)
+        )
+    limit = settings.COMMENTS_ON_PAGE
+    rows = list(comments[: limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_comment_cursor(rows[-1])
+
+
+def with_feed_related(posts):
+    """Подгружает все, что выводит карточка поста, без запросов на строку."""
+    return posts.select_related("author", "group").prefetch_related("tag")
 
 
 def get_page_obj(request, object_list: Any):
+    if settings.FEED_PAGINATION == "cursor" or "cursor" in request.GET:
+        return get_cursor_page(request, object_list)
     paginator = Paginator(object_list, settings.POST_ON_PAGE)
     page_number = request.GET.get("page")
     return paginator.get_page(page_number)
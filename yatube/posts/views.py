@@ -1,52 +1,141 @@
+import posixpath
+
+from core.degradation import serve_stale_on_error
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.http import FileResponse, Http404
 from django.shortcuts import get_object_or_404, redirect, render
-
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.http import condition, require_safe
+
+from .caching import (
+    feed_cache_context,
+    follow_feed_version,
+    get_feed_version,
+    invalidate_post_cards,
+)
+from .counters import get_author_stats
+from .feed import followed_authors, get_follow_feed
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post, User
-from .utils import get_page_obj
-
-
+from .images import (
+    CONTENT_TYPES,
+    ImageNotFound,
+    cache_key,
+    get_thumbnail,
+    negotiate_format,
+)
+from .models import Follow, Group, Post, Tag, User
+from .search import decode_search_cursor, get_search_page
+from .utils import (
+    decode_comment_cursor,
+    get_comment_batch,
+    get_page_obj,
+    with_feed_related,
+)
+
+
+@serve_stale_on_error
 def index(request):
-    posts = Post.objects.select_related("group")
+    posts = with_feed_related(Post.objects.all())
 
     template = "posts/index.html"
-    context = {"page_obj": get_page_obj(request, posts)}
+    context = {
+        "page_obj": get_page_obj(request, posts),
+        **feed_cache_context(get_feed_version("index")),
+    }
     return render(request, template, context)
 
 
+@serve_stale_on_error
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
 
-    posts = group.posts
-    context = {"group": group, "page_obj": get_page_obj(request, posts.all())}
+    posts = with_feed_related(group.posts.all())
+    context = {
+        "group": group,
+        "page_obj": get_page_obj(request, posts),
+        **feed_cache_context(get_feed_version("group", group.pk)),
+    }
     return render(request, "posts/group_list.html", context)
 
 
+def tag_posts(request, name):
+    tag = get_object_or_404(Tag, name=name)
+
+    posts = with_feed_related(Post.objects.filter(tagpost__tag=tag)).order_by(
+        "-tagpost__pub_date", "-tagpost__post__id"
+    )
+    context = {
+        "tag": tag,
+        "page_obj": get_page_obj(request, posts),
+        **feed_cache_context(get_feed_version("tag", tag.pk)),
+    }
+    return render(request, "posts/tag_list.html", context)
+
+
+@serve_stale_on_error
 def profile(request, username):
     author = get_object_or_404(User, username=username)
-    posts = author.posts
+    posts = with_feed_related(author.posts.all())
+    stats = get_author_stats(author)
 
-    following = author.following.filter(user=request.user)
+    following = (
+        request.user.is_authenticated
+        and author.following.filter(user=request.user).exists()
+    )
 
     context = {
         "author": author,
-        "page_obj": get_page_obj(request, posts.all()),
+        "page_obj": get_page_obj(request, posts),
+        "stats": stats,
         "following": following,
+        **feed_cache_context(get_feed_version("profile", author.pk)),
     }
 
     return render(request, "posts/profile.html", context)
 
 
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related("author", "group"), pk=post_id
+    )
 
-    comments = post.comments
+    comments, next_cursor = get_comment_batch(post.comments, None)
     form = CommentForm(request.POST or None)
 
-    context = {"post": post, "comments": comments.all(), "form": form}
+    context = {
+        "post": post,
+        "comments": comments,
+        "comments_cursor": next_cursor,
+        "form": form,
+        "author_stats": get_author_stats(post.author),
+    }
     return render(request, "posts/post_detail.html", context)
 
 
+def post_comments(request, post_id):
+    """Фрагмент со следующей пачкой комментариев для «Показать еще»."""
+    post = get_object_or_404(Post.objects.only("pk"), pk=post_id)
+    cursor = decode_comment_cursor(request.GET.get("after"))
+    comments, next_cursor = get_comment_batch(post.comments, cursor)
+    context = {
+        "post": post,
+        "comments": comments,
+        "comments_cursor": next_cursor,
+    }
+    return render(request, "includes/comment_list.html", context)
+
+
+def search(request):
+    query = request.GET.get("q", "").strip()
+    page_obj = None
+    if query:
+        cursor = decode_search_cursor(request.GET.get("after"))
+        page_obj = get_search_page(query, cursor)
+    context = {"query": query, "page_obj": page_obj}
+    return render(request, "posts/search.html", context)
+
+
 @login_required
 def post_create(request):
     post = Post(author=request.user)
@@ -76,6 +165,7 @@ def post_edit(request, post_id):
         context = {"form": form, "is_edit": is_form_edit, "post": post}
         return render(request, "posts/create_post.html", context)
 
+    invalidate_post_cards(post)
     form.save()
     return redirect("posts:post_detail", post_id)
 
@@ -94,8 +184,12 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
-    context = {"page_obj": get_page_obj(request, posts)}
+    posts = get_follow_feed(request.user)
+    version = follow_feed_version(followed_authors(request.user))
+    context = {
+        "page_obj": get_page_obj(request, posts),
+        **feed_cache_context(version),
+    }
 
     return render(request, "posts/follow.html", context)
 
@@ -123,3 +217,27 @@ def profile_unfollow(request, username):
 
     following_list.delete()
     return redirect("posts:profile", username=username)
+
+
+def thumbnail_etag(request, width, path):
+    fmt = negotiate_format(request.META.get("HTTP_ACCEPT"))
+    return cache_key(posixpath.normpath(path), width, fmt)
+
+
+@require_safe
+@condition(etag_func=thumbnail_etag)
+def thumbnail(request, width, path):
+    """Уменьшенная копия картинки поста из дискового кеша."""
+    fmt = negotiate_format(request.META.get("HTTP_ACCEPT"))
+    try:
+        file_path = get_thumbnail(path, width, fmt)
+    except ImageNotFound:
+        raise Http404
+    response = FileResponse(
+        open(file_path, "rb"), content_type=CONTENT_TYPES[fmt]
+    )
+    response["Cache-Control"] = (
+        f"public, max-age={settings.IMAGE_CACHE_MAX_AGE}, immutable"
+    )
+    patch_vary_headers(response, ["Accept"])
+    return response
@@ -0,0 +1,183 @@
+"""Прогрев кешей после выкладки и перезапуска воркеров.
+
+Анонимно отрисовывает первые страницы главной, ленты самых активных
+групп и профили авторов с наибольшим числом подписчиков, чтобы их
+фрагменты и карточки оказались в кеше, а затем создает копии картинок
+постов с этих страниц в дисковом кеше. Работа идет в пуле потоков с
+ограничением по времени: после срока новые задачи не начинаются.
+
+LocMemCache у каждого процесса свой, поэтому команда warm_cache полезна
+с общим кешем (CACHE_BACKEND=shared и т. п.), а при CACHE_WARM_ON_BOOT
+прогрев запускается в фоне при загрузке каждого воркера (см. wsgi.py).
+"""
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection
+from django.db.models import Count, Q
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from . import images
+from .models import AuthorStats, Group, Post
+
+logger = logging.getLogger(__name__)
+
+
+def active_groups(limit):
+    since = timezone.now() - timedelta(days=settings.CACHE_WARM_ACTIVITY_DAYS)
+    return list(
+        Group.objects.annotate(
+            recent=Count("posts", filter=Q(posts__pub_date__gte=since))
+        )
+        .filter(recent__gt=0)
+        .order_by("-recent")
+        .values_list("slug", flat=True)[:limit]
+    )
+
+
+def followed_authors(limit):
+    return list(
+        AuthorStats.objects.filter(followers_count__gt=0)
+        .order_by("-followers_count")
+        .values_list("user__username", flat=True)[:limit]
+    )
+
+
+def page_urls(pages, groups, profiles):
+    """Адреса страниц в порядке важности: главная, группы, профили."""
+    index = reverse("posts:index")
+    urls = [index] + [f"{index}?page={n}" for n in range(2, pages + 1)]
+    urls += [
+        reverse("posts:group_list", args=[slug])
+        for slug in active_groups(groups)
+    ]
+    urls += [
+        reverse("posts:profile", args=[username])
+        for username in followed_authors(profiles)
+    ]
+    return urls
+
+
+def image_names(pages, groups, profiles):
+    """Картинки постов с прогреваемых страниц."""
+    size = settings.POST_ON_PAGE
+    posts = Post.objects.exclude(image="")
+    feeds = [posts.order_by("-pub_date", "-id")[: pages * size]]
+    feeds += [
+        posts.filter(group__slug=slug)[:size] for slug in active_groups(groups)
+    ]
+    feeds += [
+        posts.filter(author__username=username)[:size]
+        for username in followed_authors(profiles)
+    ]
+    names = []
+    for feed in feeds:
+        names += feed.values_list("image", flat=True)
+    return list(dict.fromkeys(names))
+
+
+def render_page(url):
+    request = RequestFactory().get(url)
+    request.user = AnonymousUser()
+    match = resolve(request.path)
+    response = match.func(request, *match.args, **match.kwargs)
+    return f"{url} ({response.status_code})"
+
+
+def make_thumbnails(name):
+    for width in settings.POST_IMAGE_WIDTHS:
+        for fmt in images.available_formats():
+            images.get_thumbnail(name, width, fmt)
+    return name
+
+
+def in_thread(func, arg):
+    try:
+        return func(arg)
+    finally:
+        connection.close()
+
+
+def run_inline(tasks, deadline):
+    for func, arg in tasks:
+        if time.monotonic() >= deadline:
+            return
+        try:
+            yield True, func(arg)
+        except Exception as error:
+            yield False, error
+
+
+def run_pooled(tasks, concurrency, deadline):
+    queue = iter(tasks)
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        pending = set()
+        while True:
+            while len(pending) < concurrency and time.monotonic() < deadline:
+                task = next(queue, None)
+                if task is None:
+                    break
+                pending.add(pool.submit(in_thread, *task))
+            if not pending:
+                return
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                error = future.exception()
+                yield error is None, error or future.result()
+
+
+def run_tasks(tasks, concurrency, deadline):
+    """Результаты задач по мере готовности: (успех, результат или ошибка).
+
+    В пул отдается не больше concurrency задач за раз, чтобы после срока
+    оставшиеся просто не начинались; concurrency 0 — в текущем потоке.
+    """
+    if concurrency < 1:
+        return run_inline(tasks, deadline)
+    return run_pooled(tasks, concurrency, deadline)
+
+
+def warm(pages, groups, profiles, concurrency, budget, log=logger.info):
+    """Выполняет прогрев; возвращает число готовых, упавших и пропущенных
+    из-за бюджета задач."""
+    deadline = time.monotonic() + budget
+    tasks = [(render_page, url) for url in page_urls(pages, groups, profiles)]
+    tasks += [
+        (make_thumbnails, name)
+        for name in image_names(pages, groups, profiles)
+    ]
+    done = failed = 0
+    for ok, result in run_tasks(tasks, concurrency, deadline):
+        if ok:
+            log(f"Прогрето: {result}")
+            done += 1
+        else:
+            logger.error("Cache warm-up task failed: %r", result)
+            failed += 1
+    return done, failed, len(tasks) - done - failed
+
+
+def warm_on_boot():
+    """Запускает прогрев в фоне, если он включен CACHE_WARM_ON_BOOT."""
+    if not settings.CACHE_WARM_ON_BOOT:
+        return None
+    thread = threading.Thread(
+        target=warm,
+        args=(
+            settings.CACHE_WARM_PAGES,
+            settings.CACHE_WARM_GROUPS,
+            settings.CACHE_WARM_PROFILES,
+            settings.CACHE_WARM_CONCURRENCY,
+            settings.CACHE_WARM_BUDGET,
+        ),
+        daemon=True,
+    )
+    thread.start()
+    return thread
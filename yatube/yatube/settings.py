@@ -1,5 +1,6 @@
 from dotenv import load_dotenv
 import os
+import tempfile
 
 load_dotenv()
 
@@ -49,7 +50,9 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "core.coalescing.RequestCoalescingMiddleware",
     "debug_toolbar.middleware.DebugToolbarMiddleware",
+    "core.query_budget.QueryBudgetMiddleware",
 ]
 
 INTERNAL_IPS = ["127.0.0.1"]
@@ -111,6 +114,52 @@ CACHES = {
         "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
     }
 }
+# CACHE_BACKEND=shared включает общий для всех воркеров машины кеш
+# в отображенном в память файле, см. core.shared_cache
+if os.getenv("CACHE_BACKEND") == "shared":
+    CACHES["default"] = {
+        "BACKEND": "core.shared_cache.SharedMemoryCache",
+        "LOCATION": os.getenv(
+            "CACHE_LOCATION",
+            os.path.join(tempfile.gettempdir(), "yatube-cache"),
+        ),
+        "OPTIONS": {"SLOTS": 2048, "SLOT_SIZE": 64 * 1024, "WAYS": 8},
+    }
+# Фрагменты лент сбрасываются версией ленты, поэтому живут долго
+FEED_CACHE_TIMEOUT = 60 * 60 * 6
+# Защита от одновременного пересчета (core.stampede): сколько устаревшая
+# копия живет после срока, блокировка пересчета, ожидание при промахе и
+# коэффициент раннего обновления XFetch
+STAMPEDE_STALE_SECONDS = 5 * 60
+STAMPEDE_LOCK_TIMEOUT = 30
+STAMPEDE_WAIT_SECONDS = 2
+STAMPEDE_POLL_SECONDS = 0.05
+STAMPEDE_BETA = 1.0
+# Анонимные ленты при медленной или упавшей БД отдаются из последней
+# удачной копии (core.degradation): бюджет времени запросов, срок жизни
+# и частота обновления копии, порог и окно сбоев предохранителя и время,
+# на которое он размыкается
+DEGRADED_LATENCY_BUDGET = 2.0
+DEGRADED_COPY_TIMEOUT = 60 * 60 * 24
+DEGRADED_COPY_REFRESH = 60
+BREAKER_FAILURES = 5
+BREAKER_WINDOW = 30
+BREAKER_COOLDOWN = 15
+# Одинаковые анонимные GET-запросы в одном процессе ждут ответ первого
+# (core.coalescing) не дольше COALESCE_TIMEOUT; ключ учитывает заголовки
+COALESCE_TIMEOUT = 10
+COALESCE_VARY_HEADERS = ("HTTP_ACCEPT", "HTTP_ACCEPT_LANGUAGE")
+# Прогрев кешей после выкладки (posts.warmup, команда warm_cache): число
+# страниц главной, самых активных за CACHE_WARM_ACTIVITY_DAYS групп и
+# самых читаемых профилей, число потоков и бюджет в секундах.
+# CACHE_WARM_ON_BOOT=1 запускает прогрев в фоне при загрузке воркера
+CACHE_WARM_ON_BOOT = os.getenv("CACHE_WARM_ON_BOOT") == "1"
+CACHE_WARM_PAGES = 3
+CACHE_WARM_GROUPS = 10
+CACHE_WARM_PROFILES = 10
+CACHE_WARM_ACTIVITY_DAYS = 7
+CACHE_WARM_CONCURRENCY = 4
+CACHE_WARM_BUDGET = 30
 
 # Internationalization
 # https://docs.djangoproject.com/en/2.2/topics/i18n/
@@ -145,4 +194,60 @@ EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 
 POST_ON_PAGE = 10
+COMMENTS_ON_PAGE = 20
+TAG_CLOUD_SIZE = 30
+# Уменьшенные копии картинок постов отдает /media/thumb/<ширина>/<путь>:
+# допустимые ширины, ширина по умолчанию и пропорции кадра
+POST_IMAGE_WIDTHS = (480, 960, 1920)
+POST_IMAGE_WIDTH = 960
+POST_IMAGE_RATIO = (960, 339)
+IMAGE_QUALITY = 85
+# Дисковый кеш копий внутри MEDIA_ROOT и срок кеширования у клиента
+IMAGE_CACHE_DIR = "cache"
+IMAGE_CACHE_MAX_AGE = 60 * 60 * 24 * 365
+POST_THUMBNAIL_WORKERS = 2
+POST_THUMBNAIL_QUEUE_TIMEOUT = 60
+# Загрузки крупнее этого пишутся во временный файл частями; картинки
+# сверх лимитов объема и пикселей отклоняются, а оригиналы больше
+# POST_IMAGE_MAX_SIDE по большей стороне уменьшаются (см. posts.ingest)
+FILE_UPLOAD_MAX_MEMORY_SIZE = 256 * 1024
+POST_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 24 * 10 ** 6
+POST_IMAGE_MAX_SIDE = 2560
+# collect_media не удаляет файлы без ссылок моложе этого срока
+MEDIA_GC_GRACE_SECONDS = 60 * 60 * 24
+# Популярные теги: размер интервала счетчиков, ширина окна и размер топа
+TRENDING_BUCKET_SECONDS = 5 * 60
+TRENDING_WINDOW_SECONDS = 60 * 60
+TRENDING_TOP = 10
+TRENDING_CACHE_TIMEOUT = 60
+# Предельное число SQL-запросов на страницу по имени URL; проверяется
+# тестами и QueryBudgetMiddleware в режиме DEBUG
+QUERY_BUDGETS = {
+    "posts:index": 6,
+    "posts:group_list": 7,
+    "posts:tag_list": 7,
+    "posts:profile": 8,
+    "posts:post_detail": 6,
+    "posts:post_comments": 2,
+    "posts:thumbnail": 0,
+    "posts:follow_index": 9,
+    "posts:search": 4,
+    "posts:post_create": 4,
+    "posts:post_edit": 6,
+}
+# "page" — нумерованные страницы, "cursor" — ключевая пагинация по
+# (pub_date, id) без COUNT(*) и OFFSET
+FEED_PAGINATION = os.getenv("FEED_PAGINATION", "page")
 CHAR_IN_WORD = 15
+
+# Лента подписок: "pull" — выборка при чтении, "push" — раскладка по
+# лентам при публикации, "hybrid" — раскладка только для авторов, у которых
+# не больше FEED_FANOUT_FOLLOWER_LIMIT подписчиков
+FOLLOW_FEED_MODE = os.getenv("FOLLOW_FEED_MODE", "hybrid")
+FEED_FANOUT_FOLLOWER_LIMIT = 10000
+# Сколько подписчиков обрабатывать за одну вставку, число фоновых потоков
+# раскладки и глубина заполнения ленты при подписке
+FEED_FANOUT_BATCH_SIZE = 1000
+FEED_FANOUT_WORKERS = 2
+FEED_BACKFILL_LIMIT = 1000
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
 
 application = get_wsgi_application()
+
+# Прогрев кешей в фоне, если задан CACHE_WARM_ON_BOOT=1
+from posts.warmup import warm_on_boot  # noqa: E402
+
+warm_on_boot()